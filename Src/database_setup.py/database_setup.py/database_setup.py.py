@@ -1,20 +1,184 @@
 import sqlite3
 import os
-from datetime import datetime
+import csv
+import json
+import time
+import hashlib
+import mmap
+import io
+import gzip
+import shutil
+import random
+import math
+import re
+import threading
+import asyncio
+from collections import Counter, OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta
 from pathlib import Path
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet- 
+    pa = None
+    pq = None
+
 class DatabaseSetup:
+    #      :  -> (, )
+    INDEXES = {
+        'idx_app_user_role': ('app_user', '(role_id)'),
+        'idx_device_model': ('device', '(model_id)'),
+        'idx_defect_device_date': ('defect', '(device_id, detection_date)'),
+        'idx_defect_open': ('defect', '(device_id, detection_date) WHERE is_repaired = 0'),
+        'idx_defect_type_date': ('defect', '(defect_type_id, detection_date)'),
+        'idx_defect_location': ('defect', '(location_id)'),
+        'idx_defect_severity_date': ('defect', '(severity_id, detection_date)'),
+        'idx_defect_detected_by': ('defect', '(detected_by_user_id)'),
+        'idx_defect_detection_date': ('defect', '(detection_date)'),
+        'idx_defect_image_defect': ('defect_image', '(defect_id, is_verified)'),
+        'idx_defect_image_verified_by': ('defect_image', '(verified_by_user_id)'),
+        'idx_defect_image_hash': ('defect_image', '(image_hash)'),
+        'idx_diagnosis_defect': ('diagnosis', '(defect_id)'),
+        'idx_diagnosis_technician_date': ('diagnosis', '(technician_id, diagnosis_date)'),
+        'idx_repair_defect': ('repair', '(defect_id)'),
+        'idx_repair_status_technician': ('repair', '(status, technician_id)'),
+        'idx_repair_technician_date': ('repair', '(technician_id, start_date)'),
+        'idx_operation_log_user': ('operation_log', '(user_id)'),
+        'idx_operation_log_record': ('operation_log', '(table_name, record_id)'),
+    }
+
+    #  ,        
+    REFERENCE_QUERIES = {
+        'device_defects': (
+            'SELECT d.* FROM defect d WHERE d.device_id = ? ORDER BY d.detection_date',
+            (1,)
+        ),
+        'open_defects_by_device': (
+            'SELECT d.id, d.detection_date FROM defect d '
+            'WHERE d.device_id = ? AND d.is_repaired = 0',
+            (1,)
+        ),
+        'defect_history_with_diagnosis': (
+            'SELECT d.id, dg.conclusion, r.status FROM device dv '
+            'JOIN defect d ON d.device_id = dv.id '
+            'LEFT JOIN diagnosis dg ON dg.defect_id = d.id '
+            'LEFT JOIN repair r ON r.defect_id = d.id '
+            'WHERE dv.imei = ?',
+            ('354678901234567',)
+        ),
+        'defect_images': (
+            'SELECT id, image_path FROM defect_image WHERE defect_id = ? AND is_verified = 1',
+            (1,)
+        ),
+        'repair_queue_by_technician': (
+            'SELECT id, defect_id FROM repair WHERE status = ? AND technician_id = ?',
+            ('in_progress', 1)
+        ),
+        'defects_by_period': (
+            'SELECT id FROM defect WHERE detection_date >= ? AND detection_date < ?',
+            ('2022-11-01', '2022-12-01')
+        ),
+        'defects_by_type': (
+            'SELECT id FROM defect WHERE defect_type_id = ? AND detection_date >= ?',
+            (1, '2022-01-01')
+        ),
+        'devices_by_model': (
+            'SELECT id, imei FROM device WHERE model_id = ?',
+            (1,)
+        ),
+        'user_operations': (
+            'SELECT id, operation FROM operation_log WHERE table_name = ? AND record_id = ?',
+            ('defect', 1)
+        ),
+    }
+
+    #   :  -> PRAGMA  
+    PROFILES = {
+        'oltp': {
+            'journal_mode': 'wal',
+            'synchronous': 'NORMAL',
+            'cache_size': -65536,  # 64 
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+            'foreign_keys': 1,
+            'busy_timeout': 5000,
+        },
+        'bulk_load': {
+            'journal_mode': 'wal',
+            'synchronous': 'OFF',
+            'cache_size': -262144,  # 256 
+            'mmap_size': 268435456,
+            'temp_store': 'MEMORY',
+            'foreign_keys': 0,
+            'busy_timeout': 30000,
+        },
+        'read_only_analytics': {
+            'journal_mode': 'wal',
+            'synchronous': 'NORMAL',
+            'cache_size': -131072,  # 128 
+            'mmap_size': 1073741824,
+            'temp_store': 'MEMORY',
+            'foreign_keys': 1,
+            'busy_timeout': 10000,
+            'query_only': 1,
+        },
+    }
+
+    #  ,  SQLite    
+    PRAGMA_CODES = {
+        'synchronous': {'OFF': 0, 'NORMAL': 1, 'FULL': 2, 'EXTRA': 3},
+        'temp_store': {'DEFAULT': 0, 'FILE': 1, 'MEMORY': 2},
+    }
+
     def __init__(self, db_file="smartphone_defects.db"):
         self.db_file = db_file
         self.conn = None
         self.cursor = None
+        self.profile = None
+        self.settings = {}
     
-    def connect(self):
-        """   """
-        self.conn = sqlite3.connect(self.db_file)
-        self.cursor = self.conn.cursor()
+    def connect(self, profile='oltp', check_same_thread=True):
+        """      """
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=check_same_thread)
         self.conn.row_factory = sqlite3.Row  #     
+        self.cursor = self.conn.cursor()
+        if profile is not None:
+            self.apply_profile(profile)
         return self.conn
+
+    def apply_profile(self, profile):
+        """  PRAGMA      """
+        if profile not in self.PROFILES:
+            raise ValueError(f"  : {profile}")
+        pragmas = self.PROFILES[profile]
+        for name, value in pragmas.items():
+            self.cursor.execute(f'PRAGMA {name} = {value}')
+            self.cursor.fetchall()
+        self.profile = profile
+        self.settings = self.get_settings(pragmas)
+
+        mismatches = {}
+        for name, expected in pragmas.items():
+            expected = self.PRAGMA_CODES.get(name, {}).get(str(expected).upper(), expected)
+            if str(self.settings[name]).lower() != str(expected).lower():
+                mismatches[name] = (expected, self.settings[name])
+        if mismatches:
+            print(f" '{profile}'   : {mismatches}")
+        return self.settings
+
+    def get_settings(self, names=None):
+        """   PRAGMA """
+        if names is None:
+            names = {name for pragmas in self.PROFILES.values() for name in pragmas}
+        settings = {}
+        for name in sorted(names):
+            self.cursor.execute(f'PRAGMA {name}')
+            row = self.cursor.fetchone()
+            settings[name] = row[0] if row is not None else None
+        return settings
     
     def disconnect(self):
         """   """
@@ -156,6 +320,8 @@ class DatabaseSetup:
             defect_id INTEGER NOT NULL,
             image_path TEXT NOT NULL,
             image_data BLOB,
+            image_hash TEXT,
+            image_size INTEGER,
             capture_date DATETIME DEFAULT CURRENT_TIMESTAMP,
             is_verified BOOLEAN DEFAULT FALSE,
             verified_by_user_id INTEGER,
@@ -167,6 +333,17 @@ class DatabaseSetup:
         )
         ''')
         
+        #   ,   
+        self.cursor.execute('''
+        CREATE TABLE IF NOT EXISTS image_blob (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            hash TEXT NOT NULL UNIQUE,
+            size INTEGER NOT NULL,
+            data BLOB NOT NULL,
+            created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        
         #  
         self.cursor.execute('''
         CREATE TABLE IF NOT EXISTS technician (
@@ -239,7 +416,68 @@ class DatabaseSetup:
         
         self.conn.commit()
         print("  ")
-    
+
+    def create_indexes(self):
+        """        """
+        for name, (table, definition) in self.INDEXES.items():
+            self.cursor.execute(
+                f'CREATE INDEX IF NOT EXISTS {name} ON {table} {definition}'
+            )
+        self.conn.commit()
+        print(f"  : {len(self.INDEXES)}")
+
+    def list_indexes(self):
+        """    (, , DDL)"""
+        self.cursor.execute('''
+            SELECT name, tbl_name, sql FROM sqlite_master
+            WHERE type = 'index' AND sql IS NOT NULL
+            ORDER BY tbl_name, name
+        ''')
+        return [tuple(row) for row in self.cursor.fetchall()]
+
+    def drop_indexes(self, names=None):
+        """  (  -   INDEXES)"""
+        names = list(self.INDEXES) if names is None else list(names)
+        for name in names:
+            self.cursor.execute(f'DROP INDEX IF EXISTS {name}')
+        self.conn.commit()
+        return names
+
+    def rebuild_indexes(self, names=None):
+        """   REINDEX   """
+        names = list(self.INDEXES) if names is None else list(names)
+        existing = {row[0] for row in self.list_indexes()}
+        for name in names:
+            if name in existing:
+                self.cursor.execute(f'REINDEX {name}')
+            else:
+                table, definition = self.INDEXES[name]
+                self.cursor.execute(f'CREATE INDEX {name} ON {table} {definition}')
+        self.cursor.execute('ANALYZE')
+        self.conn.commit()
+        return names
+
+    def explain_reference_queries(self, queries=None):
+        """ EXPLAIN QUERY PLAN   """
+        queries = self.REFERENCE_QUERIES if queries is None else queries
+        # EXPLAIN   ,        
+        self.cursor.execute('PRAGMA schema_version')
+        version = self.cursor.fetchone()[0]
+        plans = {}
+        for name, (sql, params) in queries.items():
+            self.cursor.execute(f'EXPLAIN QUERY PLAN {sql} -- schema {version}', params)
+            plans[name] = [row[3] for row in self.cursor.fetchall()]
+        return plans
+
+    def find_full_scans(self, queries=None):
+        """  ,      """
+        scans = {}
+        for name, plan in self.explain_reference_queries(queries).items():
+            details = [d for d in plan if d.startswith('SCAN') and 'INDEX' not in d]
+            if details:
+                scans[name] = details
+        return scans
+
     def insert_sample_data(self):
         """  """
         #  
@@ -460,12 +698,19 @@ class DatabaseSetup:
         
         # ,   
         if os.path.exists(self.db_file):
-            backup = f"{self.db_file}.backup"
-            print(f"  .   : {backup}")
-            os.rename(self.db_file, backup)
+            print("  .   ")
+            BackupManager(self.db_file).backup()
+            for suffix in ('', '-wal', '-shm', '-journal'):
+                if os.path.exists(self.db_file + suffix):
+                    os.remove(self.db_file + suffix)
         
-        self.connect()
+        self.connect(profile=None)
+        #            WAL
+        self.cursor.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        self.apply_profile('oltp')
         self.create_tables()
+        self.create_indexes()
+        MigrationManager(self).stamp()
         self.insert_sample_data()
         self.disconnect()
         
@@ -474,6 +719,3490 @@ class DatabaseSetup:
         print(": admin, manager, tech1, operator1")
         print("  : password123")
 
+
+class BulkLoader:
+    """  ,    """
+
+    DEVICE_COLUMNS = ('model_id', 'imei', 'serial_number', 'color', 'production_date',
+                      'purchase_date', 'warranty_until', 'current_owner')
+    DEFECT_COLUMNS = ('device_id', 'defect_type_id', 'location_id', 'severity_id',
+                      'detected_by_user_id', 'detection_date', 'length_mm', 'width_mm',
+                      'depth_mm', 'description', 'is_repaired', 'repair_date', 'repair_cost')
+    IMAGE_COLUMNS = ('defect_id', 'image_path', 'image_data', 'image_hash', 'image_size',
+                     'capture_date', 'is_verified', 'verified_by_user_id', 'verification_date',
+                     'verification_notes')
+
+    def __init__(self, db_setup, batch_size=5000, blob_store=None):
+        self.db = db_setup
+        self.batch_size = batch_size
+        self.blob_store = blob_store
+        self.lookups = {}
+
+    @staticmethod
+    def read_csv(path, encoding='utf-8'):
+        """  CSV-  """
+        with open(path, newline='', encoding=encoding) as f:
+            for row in csv.DictReader(f):
+                yield row
+
+    @staticmethod
+    def read_jsonl(path, encoding='utf-8'):
+        """  JSONL-  """
+        with open(path, encoding=encoding) as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    def load_lookups(self):
+        """        id"""
+        cursor = self.db.conn.cursor()
+        queries = {
+            'defect_type': 'SELECT name, id FROM defect_type',
+            'location': 'SELECT name, id FROM defect_location',
+            'severity': 'SELECT score, id FROM severity_level',
+            'manufacturer': 'SELECT name, id FROM manufacturer',
+            'model': '''SELECT m.name, sm.model_name, sm.id FROM smartphone_model sm
+                        JOIN manufacturer m ON m.id = sm.manufacturer_id''',
+        }
+        for kind, sql in queries.items():
+            cursor.execute(sql)
+            if kind == 'model':
+                self.lookups[kind] = {(r[0], r[1]): r[2] for r in cursor.fetchall()}
+            else:
+                self.lookups[kind] = {r[0]: r[1] for r in cursor.fetchall()}
+        return self.lookups
+
+    def _lookup(self, kind, key):
+        if not self.lookups:
+            self.load_lookups()
+        if kind == 'severity':
+            key = int(key)
+        try:
+            return self.lookups[kind][key]
+        except KeyError:
+            raise ValueError(f"   {kind}: {key}") from None
+
+    @staticmethod
+    def _clean(row):
+        #    CSV   NULL
+        return {k: (None if v == '' else v) for k, v in row.items()}
+
+    def _resolve_device(self, row):
+        if row.get('model_id') is None:
+            row['model_id'] = self._lookup('model', (row['manufacturer'], row['model_name']))
+        return row
+
+    def _resolve_defect(self, row):
+        if row.get('defect_type_id') is None:
+            row['defect_type_id'] = self._lookup('defect_type', row['defect_type'])
+        if row.get('location_id') is None:
+            row['location_id'] = self._lookup('location', row['location'])
+        if row.get('severity_id') is None:
+            row['severity_id'] = self._lookup('severity', row['severity_score'])
+        return row
+
+    def _resolve_image(self, row):
+        #        defect_image  
+        if self.blob_store is not None and row.get('image_data') is not None:
+            row['image_hash'], row['image_size'] = self.blob_store.put(row['image_data'])
+            row['image_data'] = None
+        return row
+
+    def _resolve_device_ids(self, batch):
+        """ IMEI  id     """
+        imeis = {row['imei'] for row in batch if row.get('device_id') is None}
+        if not imeis:
+            return batch
+        ids = {}
+        imeis = list(imeis)
+        cursor = self.db.conn.cursor()
+        for start in range(0, len(imeis), 500):
+            chunk = imeis[start:start + 500]
+            placeholders = ', '.join('?' * len(chunk))
+            cursor.execute(f'SELECT imei, id FROM device WHERE imei IN ({placeholders})', chunk)
+            ids.update(cursor.fetchall())
+        for row in batch:
+            if row.get('device_id') is None:
+                if row['imei'] not in ids:
+                    raise ValueError(f"  IMEI {row['imei']}  ")
+                row['device_id'] = ids[row['imei']]
+        return batch
+
+    def _placeholders(self, table, columns):
+        """ INSERT:    DEFAULT   """
+        defaults = {row[1]: row[4] for row in
+                    self.db.conn.execute(f'PRAGMA table_info({table})').fetchall()}
+        return [f'COALESCE(?, {defaults[c]})' if defaults.get(c) is not None else '?'
+                for c in columns]
+
+    def _load(self, table, columns, rows, resolve=None, resolve_batch=None,
+              rebuild_indexes=False):
+        conn = self.db.conn
+        sql = (f'INSERT INTO {table} ({", ".join(columns)}) '
+               f'VALUES ({", ".join(self._placeholders(table, columns))})')
+        index_names = [name for name, (tbl, _) in self.db.INDEXES.items() if tbl == table]
+        if rebuild_indexes:
+            self.db.drop_indexes(index_names)
+
+        started = time.perf_counter()
+        total = 0
+        batches = 0
+        batch = []
+
+        def flush():
+            if resolve_batch:
+                resolve_batch(batch)
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                conn.executemany(sql, [tuple(row.get(c) for c in columns) for row in batch])
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+        try:
+            for row in rows:
+                row = self._clean(row)
+                batch.append(resolve(row) if resolve else row)
+                if len(batch) >= self.batch_size:
+                    flush()
+                    total += len(batch)
+                    batches += 1
+                    batch = []
+            if batch:
+                flush()
+                total += len(batch)
+                batches += 1
+        finally:
+            if rebuild_indexes:
+                self.db.rebuild_indexes(index_names)
+
+        elapsed = time.perf_counter() - started
+        stats = {
+            'table': table,
+            'rows': total,
+            'batches': batches,
+            'seconds': round(elapsed, 3),
+            'rows_per_second': round(total / elapsed, 1) if elapsed > 0 else float(total),
+        }
+        print(f"  {table}: {total} , {stats['rows_per_second']} /")
+        return stats
+
+    def load_devices(self, rows, rebuild_indexes=False):
+        """  (model_id  manufacturer + model_name)"""
+        return self._load('device', self.DEVICE_COLUMNS, rows,
+                          resolve=self._resolve_device, rebuild_indexes=rebuild_indexes)
+
+    def load_defects(self, rows, rebuild_indexes=False):
+        """  (device_id  imei,   id   )"""
+        return self._load('defect', self.DEFECT_COLUMNS, rows,
+                          resolve=self._resolve_defect,
+                          resolve_batch=self._resolve_device_ids,
+                          rebuild_indexes=rebuild_indexes)
+
+    def load_images(self, rows, rebuild_indexes=False):
+        """  """
+        return self._load('defect_image', self.IMAGE_COLUMNS, rows,
+                          resolve=self._resolve_image, rebuild_indexes=rebuild_indexes)
+
+
+class ConnectionPool:
+    """ :      """
+
+    def __init__(self, db_file="smartphone_defects.db", readers=4,
+                 read_profile='read_only_analytics', write_profile='oltp',
+                 idle_timeout=300.0):
+        self.db_file = db_file
+        self.max_readers = readers
+        self.read_profile = read_profile
+        self.write_profile = write_profile
+        self.idle_timeout = idle_timeout
+        self._cond = threading.Condition()
+        self._idle = []  # (DatabaseSetup,    )
+        self._readers_open = 0
+        self._writer = None
+        self._writer_lock = threading.Lock()
+        self._closed = False
+        self.metrics = {
+            'checkouts': 0,
+            'writer_checkouts': 0,
+            'in_use': 0,
+            'wait_seconds': 0.0,
+            'max_wait_seconds': 0.0,
+            'timeouts': 0,
+            'created': 0,
+            'evicted': 0,
+        }
+
+    def _open(self, profile):
+        db = DatabaseSetup(self.db_file)
+        db.connect(profile, check_same_thread=False)
+        with self._cond:
+            self.metrics['created'] += 1
+        return db
+
+    def _record_wait(self, started):
+        waited = time.perf_counter() - started
+        self.metrics['wait_seconds'] += waited
+        self.metrics['max_wait_seconds'] = max(self.metrics['max_wait_seconds'], waited)
+
+    @contextmanager
+    def reader(self, timeout=None):
+        """   (DatabaseSetup)    with"""
+        started = time.perf_counter()
+        with self._cond:
+            while True:
+                if self._closed:
+                    raise RuntimeError("  ")
+                if self._idle:
+                    db, _ = self._idle.pop()
+                    break
+                if self._readers_open < self.max_readers:
+                    self._readers_open += 1
+                    db = None
+                    break
+                remaining = None if timeout is None else timeout - (time.perf_counter() - started)
+                if remaining is not None and remaining <= 0:
+                    self.metrics['timeouts'] += 1
+                    raise TimeoutError("    ")
+                self._cond.wait(remaining)
+            self._record_wait(started)
+            self.metrics['checkouts'] += 1
+            self.metrics['in_use'] += 1
+
+        if db is None:
+            try:
+                db = self._open(self.read_profile)
+            except Exception:
+                with self._cond:
+                    self._readers_open -= 1
+                    self.metrics['in_use'] -= 1
+                    self._cond.notify()
+                raise
+        try:
+            yield db
+        finally:
+            if db.conn.in_transaction:
+                db.conn.rollback()
+            with self._cond:
+                self.metrics['in_use'] -= 1
+                if self._closed:
+                    db.disconnect()
+                    self._readers_open -= 1
+                else:
+                    self._idle.append((db, time.monotonic()))
+                self._evict_idle_locked()
+                self._cond.notify()
+
+    @contextmanager
+    def writer(self, timeout=None):
+        """   ; commit  , rollback  """
+        started = time.perf_counter()
+        if not self._writer_lock.acquire(timeout=-1 if timeout is None else timeout):
+            with self._cond:
+                self.metrics['timeouts'] += 1
+            raise TimeoutError("  ")
+        try:
+            with self._cond:
+                if self._closed:
+                    raise RuntimeError("  ")
+                self._record_wait(started)
+                self.metrics['writer_checkouts'] += 1
+                self.metrics['in_use'] += 1
+            try:
+                #    :    in_use 
+                if self._writer is None:
+                    self._writer = self._open(self.write_profile)
+                db = self._writer
+                try:
+                    yield db
+                    db.conn.commit()
+                except Exception:
+                    db.conn.rollback()
+                    raise
+            finally:
+                with self._cond:
+                    self.metrics['in_use'] -= 1
+        finally:
+            self._writer_lock.release()
+
+    def _evict_idle_locked(self):
+        now = time.monotonic()
+        keep = []
+        for db, released in self._idle:
+            if now - released > self.idle_timeout:
+                db.disconnect()
+                self._readers_open -= 1
+                self.metrics['evicted'] += 1
+            else:
+                keep.append((db, released))
+        self._idle = keep
+
+    def evict_idle(self):
+        """  ,   idle_timeout"""
+        with self._cond:
+            before = self.metrics['evicted']
+            self._evict_idle_locked()
+            return self.metrics['evicted'] - before
+
+    def stats(self):
+        """  """
+        with self._cond:
+            stats = dict(self.metrics)
+            stats['readers_open'] = self._readers_open
+            stats['readers_idle'] = len(self._idle)
+            total = stats['checkouts'] + stats['writer_checkouts']
+            stats['avg_wait_seconds'] = stats['wait_seconds'] / total if total else 0.0
+            return stats
+
+    def close(self):
+        """   """
+        with self._cond:
+            self._closed = True
+            for db, _ in self._idle:
+                db.disconnect()
+                self._readers_open -= 1
+            self._idle = []
+            self._cond.notify_all()
+        with self._writer_lock:
+            if self._writer is not None:
+                self._writer.disconnect()
+                self._writer = None
+
+
+class BlobStore:
+    """      (  )"""
+
+    CHUNK_SIZE = 65536
+
+    def __init__(self, db_setup, root=None):
+        self.db = db_setup
+        self.root = Path(root) if root is not None else None
+
+    def _path(self, digest):
+        #     : ab/cd/abcd...
+        return self.root / digest[:2] / digest[2:4] / digest
+
+    def _exists(self, digest):
+        if self.root is not None:
+            return self._path(digest).exists()
+        cursor = self.db.conn.execute('SELECT 1 FROM image_blob WHERE hash = ?', (digest,))
+        return cursor.fetchone() is not None
+
+    def put(self, data):
+        """  ,  (, )"""
+        digest = hashlib.sha256(data).hexdigest()
+        if self._exists(digest):
+            return digest, len(data)
+        if self.root is not None:
+            path = self._path(digest)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_bytes(data)
+            os.replace(tmp, path)
+        else:
+            self.db.conn.execute(
+                'INSERT OR IGNORE INTO image_blob (hash, size, data) VALUES (?, ?, ?)',
+                (digest, len(data), data)
+            )
+        return digest, len(data)
+
+    def put_file(self, path):
+        """   ,    """
+        digest = hashlib.sha256()
+        size = 0
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(self.CHUNK_SIZE), b''):
+                digest.update(chunk)
+                size += len(chunk)
+        digest = digest.hexdigest()
+        if self._exists(digest):
+            return digest, size
+        if self.root is not None:
+            target = self._path(digest)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_suffix('.tmp')
+            with open(path, 'rb') as src, open(tmp, 'wb') as dst:
+                for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b''):
+                    dst.write(chunk)
+            os.replace(tmp, target)
+        else:
+            #    zeroblob    
+            cursor = self.db.conn.execute(
+                'INSERT INTO image_blob (hash, size, data) VALUES (?, ?, zeroblob(?))',
+                (digest, size, size)
+            )
+            with self.db.conn.blobopen('image_blob', 'data', cursor.lastrowid) as blob, \
+                    open(path, 'rb') as src:
+                for chunk in iter(lambda: src.read(self.CHUNK_SIZE), b''):
+                    blob.write(chunk)
+        return digest, size
+
+    @contextmanager
+    def open(self, digest):
+        """     (blobopen  mmap)"""
+        if self.root is not None:
+            with open(self._path(digest), 'rb') as f:
+                if os.fstat(f.fileno()).st_size == 0:
+                    yield io.BytesIO(b'')
+                    return
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                    yield mapped
+            return
+        cursor = self.db.conn.execute('SELECT id FROM image_blob WHERE hash = ?', (digest,))
+        row = cursor.fetchone()
+        if row is None:
+            raise KeyError(digest)
+        with self.db.conn.blobopen('image_blob', 'data', row[0], readonly=True) as blob:
+            yield blob
+
+    def iter_chunks(self, digest, chunk_size=None):
+        """  """
+        chunk_size = chunk_size or self.CHUNK_SIZE
+        with self.open(digest) as stream:
+            for chunk in iter(lambda: stream.read(chunk_size), b''):
+                yield chunk
+
+    def read(self, digest):
+        """  """
+        return b''.join(self.iter_chunks(digest))
+
+    def attach(self, image_id, data):
+        """      defect_image"""
+        digest, size = self.put(data)
+        self.db.conn.execute(
+            'UPDATE defect_image SET image_hash = ?, image_size = ?, image_data = NULL WHERE id = ?',
+            (digest, size, image_id)
+        )
+        self.db.conn.commit()
+        return digest
+
+    def read_image(self, image_id):
+        """   id  defect_image"""
+        cursor = self.db.conn.execute(
+            'SELECT image_hash, image_data FROM defect_image WHERE id = ?', (image_id,)
+        )
+        row = cursor.fetchone()
+        if row is None:
+            raise KeyError(image_id)
+        if row[0] is None:
+            return row[1]
+        return self.read(row[0])
+
+    def migrate_inline(self, batch_size=500):
+        """  image_data   """
+        conn = self.db.conn
+        moved = 0
+        while True:
+            rows = conn.execute(
+                'SELECT id, image_data FROM defect_image WHERE image_data IS NOT NULL LIMIT ?',
+                (batch_size,)
+            ).fetchall()
+            if not rows:
+                break
+            for image_id, data in rows:
+                digest, size = self.put(data)
+                conn.execute(
+                    'UPDATE defect_image SET image_hash = ?, image_size = ?, image_data = NULL '
+                    'WHERE id = ?',
+                    (digest, size, image_id)
+                )
+            conn.commit()
+            moved += len(rows)
+        print(f"   : {moved}")
+        return moved
+
+    def collect_garbage(self):
+        """ ,      defect_image ( )"""
+        conn = self.db.conn
+        with ArchiveManager.attached(conn) as schemas:
+            referenced_sql = ' UNION '.join(
+                f'SELECT image_hash FROM {schema}.defect_image WHERE image_hash IS NOT NULL'
+                for schema in ['main'] + schemas
+            )
+            removed = 0
+            if self.root is not None:
+                referenced = {row[0] for row in conn.execute(referenced_sql)}
+                for path in self.root.glob('*/*/*'):
+                    if path.suffix != '.tmp' and path.name not in referenced:
+                        path.unlink()
+                        removed += 1
+            else:
+                removed = conn.execute(
+                    f'DELETE FROM image_blob WHERE hash NOT IN ({referenced_sql})'
+                ).rowcount
+                conn.commit()
+        return removed
+
+
+class AuditLog:
+    """    operation_log  """
+
+    TABLES = ('device', 'defect', 'diagnosis', 'repair')
+    LOG_COLUMNS = ('user_id', 'table_name', 'record_id', 'operation', 'old_values',
+                   'new_values', 'operation_date', 'ip_address', 'user_agent')
+
+    def __init__(self, db_setup, buffered=False, audit_db=None, flush_size=1000):
+        self.db = db_setup
+        # buffered:     temp.audit_buffer, flush()  
+        # audit_db:      ( )
+        self.buffered = buffered or audit_db is not None
+        self.audit_db = audit_db
+        self.flush_size = flush_size
+        self.target = 'audit' if audit_db is not None else 'main'
+
+    def _columns(self, table):
+        cursor = self.db.conn.execute(f'PRAGMA main.table_info({table})')
+        return [row[1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def _json(prefix, columns):
+        return 'json_object(' + ', '.join(f"'{c}', {prefix}.{c}" for c in columns) + ')'
+
+    @staticmethod
+    def _diff(prefix, columns):
+        #   : {"": }
+        parts = ' UNION ALL '.join(
+            f"SELECT '{c}' AS k, {prefix}.{c} AS v WHERE OLD.{c} IS NOT NEW.{c}"
+            for c in columns
+        )
+        return f'(SELECT json_group_object(k, v) FROM ({parts}))'
+
+    #   -    ;   temp.audit_buffer
+    #     . pragma_table_info   
+    #       
+    SHARED_CONDITION = "NOT EXISTS (SELECT 1 FROM pragma_table_info('audit_buffer'))"
+
+    def _trigger_sql(self, table, operation, buffered):
+        columns = self._columns(table)
+        changed = [c for c in columns if c != 'id']
+        conditions = []
+        if buffered:
+            create = f'CREATE TEMP TRIGGER IF NOT EXISTS audit_{table}_{operation}'
+            source = f'main.{table}'
+            #      , temp  
+            target = 'audit_buffer'
+            context = ('(SELECT user_id FROM audit_context)',
+                       '(SELECT ip_address FROM audit_context)',
+                       '(SELECT user_agent FROM audit_context)')
+        else:
+            #      ,   
+            create = f'CREATE TRIGGER IF NOT EXISTS audit_{table}_{operation}'
+            source = table
+            target = 'operation_log'
+            context = ('NULL', 'NULL', 'NULL')
+            conditions.append(self.SHARED_CONDITION)
+
+        if operation == 'insert':
+            record_id, old_values, new_values = 'NEW.id', 'NULL', self._json('NEW', columns)
+        elif operation == 'delete':
+            record_id, old_values, new_values = 'OLD.id', self._json('OLD', columns), 'NULL'
+            conditions.append(ArchiveManager.GUARD_CONDITION)  #     
+        else:
+            record_id = 'NEW.id'
+            old_values, new_values = self._diff('OLD', changed), self._diff('NEW', changed)
+            conditions.append('(' + ' OR '.join(f'OLD.{c} IS NOT NEW.{c}' for c in changed) + ')')
+        when = 'WHEN ' + ' AND '.join(conditions) if conditions else ''
+
+        return f'''
+        {create} AFTER {operation.upper()} ON {source} {when}
+        BEGIN
+            INSERT INTO {target}
+            (user_id, table_name, record_id, operation, old_values, new_values,
+             operation_date, ip_address, user_agent)
+            VALUES ({context[0]}, '{table}', {record_id}, '{operation}', {old_values},
+                    {new_values}, CURRENT_TIMESTAMP, {context[1]}, {context[2]});
+        END
+        '''
+
+    def install(self):
+        """     """
+        conn = self.db.conn
+        if self.audit_db is not None:
+            attached = {row[1] for row in conn.execute('PRAGMA database_list')}
+            if 'audit' not in attached:
+                conn.execute('ATTACH DATABASE ? AS audit', (str(self.audit_db),))
+            conn.execute('''
+            CREATE TABLE IF NOT EXISTS audit.operation_log (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                user_id INTEGER,
+                table_name TEXT,
+                record_id INTEGER,
+                operation TEXT CHECK(operation IN ('insert', 'update', 'delete')),
+                old_values TEXT,
+                new_values TEXT,
+                operation_date DATETIME DEFAULT CURRENT_TIMESTAMP,
+                ip_address TEXT,
+                user_agent TEXT
+            )
+            ''')
+        if self.buffered:
+            conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS audit_buffer (
+                id INTEGER PRIMARY KEY,
+                user_id INTEGER,
+                table_name TEXT,
+                record_id INTEGER,
+                operation TEXT,
+                old_values TEXT,
+                new_values TEXT,
+                operation_date DATETIME,
+                ip_address TEXT,
+                user_agent TEXT
+            )
+            ''')
+            conn.execute('''
+            CREATE TEMP TABLE IF NOT EXISTS audit_context (
+                user_id INTEGER,
+                ip_address TEXT,
+                user_agent TEXT
+            )
+            ''')
+        else:
+            self._drop_buffer()
+        ArchiveManager.ensure_guard(conn)
+        #        ; 
+        #      .     
+        for table in self.TABLES:
+            for operation in ('insert', 'update', 'delete'):
+                for schema in ('main', 'temp'):
+                    conn.execute(f'DROP TRIGGER IF EXISTS {schema}.audit_{table}_{operation}')
+                conn.execute(self._trigger_sql(table, operation, buffered=False))
+                if self.buffered:
+                    conn.execute(self._trigger_sql(table, operation, buffered=True))
+        conn.commit()
+        print(f"   : {', '.join(self.TABLES)}")
+
+    def _drop_buffer(self):
+        #          
+        conn = self.db.conn
+        if not conn.execute("SELECT 1 FROM temp.sqlite_master WHERE name = 'audit_buffer'").fetchone():
+            return
+        if self.buffered:
+            self.flush()
+        elif conn.execute('SELECT COUNT(*) FROM temp.audit_buffer').fetchone()[0]:
+            raise RuntimeError("     :  flush()")
+        conn.execute('DROP TABLE temp.audit_buffer')
+        conn.execute('DROP TABLE IF EXISTS temp.audit_context')
+
+    def uninstall(self):
+        """   (  )   """
+        conn = self.db.conn
+        self._drop_buffer()
+        for table in self.TABLES:
+            for operation in ('insert', 'update', 'delete'):
+                conn.execute(f'DROP TRIGGER IF EXISTS temp.audit_{table}_{operation}')
+                conn.execute(f'DROP TRIGGER IF EXISTS main.audit_{table}_{operation}')
+        conn.commit()
+
+    def set_context(self, user_id=None, ip_address=None, user_agent=None):
+        """        """
+        if not self.buffered:
+            raise RuntimeError("      ")
+        conn = self.db.conn
+        conn.execute('DELETE FROM temp.audit_context')
+        conn.execute('INSERT INTO temp.audit_context VALUES (?, ?, ?)',
+                     (user_id, ip_address, user_agent))
+
+    def pending(self):
+        """   """
+        if not self.buffered:
+            return 0
+        return self.db.conn.execute('SELECT COUNT(*) FROM temp.audit_buffer').fetchone()[0]
+
+    def flush(self):
+        """    operation_log  """
+        if not self.buffered:
+            return 0
+        conn = self.db.conn
+        columns = ', '.join(self.LOG_COLUMNS)
+        moved = conn.execute(
+            f'INSERT INTO {self.target}.operation_log ({columns}) '
+            f'SELECT {columns} FROM temp.audit_buffer ORDER BY id'
+        ).rowcount
+        conn.execute('DELETE FROM temp.audit_buffer')
+        conn.commit()
+        return moved
+
+    def maybe_flush(self):
+        """ ,     flush_size """
+        if self.pending() >= self.flush_size:
+            return self.flush()
+        return 0
+
+
+class DefectStatistics:
+    """    ,  """
+
+    OPEN_STATUSES = "('pending', 'in_progress', 'on_hold')"
+
+    # :  -> ( , ,  )
+    DIMENSIONS = {
+        'date': ('stat_date', None, None),
+        'model': ('model_id', 'smartphone_model', 'model_name'),
+        'manufacturer': ('manufacturer_id', 'manufacturer', 'name'),
+        'defect_type': ('defect_type_id', 'defect_type', 'name'),
+        'severity': ('severity_id', 'severity_level', 'level_name'),
+    }
+
+    def __init__(self, db_setup):
+        self.db = db_setup
+
+    @staticmethod
+    def _stat_date(row):
+        # detection_date  NULL:     
+        return f"COALESCE(date({row}.detection_date), date({row}.created_at), '1970-01-01')"
+
+    @staticmethod
+    def _repaired(row):
+        return f'(IFNULL({row}.is_repaired, 0) <> 0)'
+
+    def _defect_delta(self, row, sign):
+        #  (sign = 1)   (sign = -1)   
+        return f'''
+            INSERT INTO defect_daily_stats
+            (stat_date, model_id, manufacturer_id, defect_type_id, severity_id,
+             defect_count, repaired_count)
+            SELECT {self._stat_date(row)}, dv.model_id, sm.manufacturer_id,
+                   {row}.defect_type_id, {row}.severity_id,
+                   {sign}, {sign} * {self._repaired(row)}
+            FROM device dv JOIN smartphone_model sm ON sm.id = dv.model_id
+            WHERE dv.id = {row}.device_id
+            ON CONFLICT (stat_date, model_id, defect_type_id, severity_id) DO UPDATE SET
+                defect_count = defect_count + excluded.defect_count,
+                repaired_count = repaired_count + excluded.repaired_count;
+        '''
+
+    @classmethod
+    def _defect_cleanup(cls, row):
+        #  ,     
+        return f'''
+            DELETE FROM defect_daily_stats
+            WHERE stat_date = {cls._stat_date(row)}
+              AND model_id = (SELECT model_id FROM device WHERE id = {row}.device_id)
+              AND defect_type_id = {row}.defect_type_id
+              AND severity_id = {row}.severity_id
+              AND defect_count = 0;
+        '''
+
+    @staticmethod
+    def _repair_cleanup(row):
+        return f'''
+            DELETE FROM technician_repair_stats
+            WHERE technician_id = {row}.technician_id
+              AND open_count = 0 AND completed_count = 0;
+        '''
+
+    def _repair_delta(self, row, sign):
+        is_open = f'({row}.status IN {self.OPEN_STATUSES})'
+        is_done = f"({row}.status = 'completed')"
+        return f'''
+            INSERT INTO technician_repair_stats
+            (technician_id, open_count, open_cost, completed_count, completed_cost)
+            VALUES ({row}.technician_id,
+                    {sign} * {is_open},
+                    {sign} * CASE WHEN {is_open} THEN IFNULL({row}.cost, 0) ELSE 0 END,
+                    {sign} * {is_done},
+                    {sign} * CASE WHEN {is_done} THEN IFNULL({row}.cost, 0) ELSE 0 END)
+            ON CONFLICT (technician_id) DO UPDATE SET
+                open_count = open_count + excluded.open_count,
+                open_cost = open_cost + excluded.open_cost,
+                completed_count = completed_count + excluded.completed_count,
+                completed_cost = completed_cost + excluded.completed_cost;
+        '''
+
+    def install(self):
+        """      """
+        cursor = self.db.conn.cursor()
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS defect_daily_stats (
+            stat_date DATE NOT NULL,
+            model_id INTEGER NOT NULL,
+            manufacturer_id INTEGER NOT NULL,
+            defect_type_id INTEGER NOT NULL,
+            severity_id INTEGER NOT NULL,
+            defect_count INTEGER NOT NULL DEFAULT 0,
+            repaired_count INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (stat_date, model_id, defect_type_id, severity_id)
+        ) WITHOUT ROWID
+        ''')
+        cursor.execute('''
+        CREATE TABLE IF NOT EXISTS technician_repair_stats (
+            technician_id INTEGER PRIMARY KEY,
+            open_count INTEGER NOT NULL DEFAULT 0,
+            open_cost REAL NOT NULL DEFAULT 0,
+            completed_count INTEGER NOT NULL DEFAULT 0,
+            completed_cost REAL NOT NULL DEFAULT 0
+        )
+        ''')
+
+        tracked = 'device_id, defect_type_id, severity_id, detection_date, created_at, is_repaired'
+        #     
+        ArchiveManager.ensure_guard(cursor)
+        guard = ArchiveManager.GUARD_CONDITION
+        triggers = {
+            'stats_defect_insert': f'AFTER INSERT ON defect BEGIN {self._defect_delta("NEW", 1)} END',
+            'stats_defect_update': (f'AFTER UPDATE OF {tracked} ON defect BEGIN '
+                                    f'{self._defect_delta("OLD", -1)} '
+                                    f'{self._defect_cleanup("OLD")} '
+                                    f'{self._defect_delta("NEW", 1)} END'),
+            'stats_defect_delete': (f'AFTER DELETE ON defect WHEN {guard} BEGIN '
+                                    f'{self._defect_delta("OLD", -1)} '
+                                    f'{self._defect_cleanup("OLD")} END'),
+            'stats_repair_insert': f'AFTER INSERT ON repair BEGIN {self._repair_delta("NEW", 1)} END',
+            'stats_repair_update': (f'AFTER UPDATE OF technician_id, status, cost ON repair BEGIN '
+                                    f'{self._repair_delta("OLD", -1)} '
+                                    f'{self._repair_cleanup("OLD")} '
+                                    f'{self._repair_delta("NEW", 1)} END'),
+            'stats_repair_delete': (f'AFTER DELETE ON repair WHEN {guard} BEGIN '
+                                    f'{self._repair_delta("OLD", -1)} '
+                                    f'{self._repair_cleanup("OLD")} END'),
+        }
+        # ,   install   
+        for name, body in triggers.items():
+            cursor.execute(f'DROP TRIGGER IF EXISTS {name}')
+            cursor.execute(f'CREATE TRIGGER {name} {body}')
+        self.db.conn.commit()
+
+    @staticmethod
+    def _union(schemas, table, columns):
+        #      :  
+        #     ,    
+        return ' UNION ALL '.join(f'SELECT {columns} FROM {schema}.{table}'
+                                  for schema in ['main'] + schemas)
+
+    def rebuild(self):
+        """       """
+        conn = self.db.conn
+        started = time.perf_counter()
+        with ArchiveManager.attached(conn) as schemas:
+            self._rebuild(schemas)
+        elapsed = time.perf_counter() - started
+        print(f"   {elapsed:.2f} ")
+        return elapsed
+
+    def _rebuild(self, schemas):
+        conn = self.db.conn
+        defects = self._union(schemas, 'defect', 'device_id, defect_type_id, severity_id, '
+                                                 'detection_date, created_at, is_repaired')
+        repairs = self._union(schemas, 'repair', 'technician_id, status, cost')
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.execute('DELETE FROM defect_daily_stats')
+            conn.execute(f'''
+                INSERT INTO defect_daily_stats
+                (stat_date, model_id, manufacturer_id, defect_type_id, severity_id,
+                 defect_count, repaired_count)
+                SELECT {self._stat_date('d')}, dv.model_id, sm.manufacturer_id,
+                       d.defect_type_id, d.severity_id, COUNT(*), SUM{self._repaired('d')}
+                FROM ({defects}) d
+                JOIN main.device dv ON dv.id = d.device_id
+                JOIN main.smartphone_model sm ON sm.id = dv.model_id
+                GROUP BY 1, 2, 3, 4, 5
+            ''')
+            conn.execute('DELETE FROM technician_repair_stats')
+            conn.execute(f'''
+                INSERT INTO technician_repair_stats
+                (technician_id, open_count, open_cost, completed_count, completed_cost)
+                SELECT technician_id,
+                       SUM(status IN {self.OPEN_STATUSES}),
+                       SUM(CASE WHEN status IN {self.OPEN_STATUSES} THEN IFNULL(cost, 0) ELSE 0 END),
+                       SUM(status = 'completed'),
+                       SUM(CASE WHEN status = 'completed' THEN IFNULL(cost, 0) ELSE 0 END)
+                FROM ({repairs})
+                GROUP BY technician_id
+            ''')
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def defect_counts(self, by=('date',), start_date=None, end_date=None, **filters):
+        """   ,  by=('manufacturer', 'severity')"""
+        select = []
+        group = []
+        joins = []
+        for name in by:
+            column, table, label = self.DIMENSIONS[name]
+            select.append(f's.{column}')
+            group.append(f's.{column}')
+            if table is not None:
+                joins.append(f'LEFT JOIN {table} {name} ON {name}.id = s.{column}')
+                select.append(f'{name}.{label} AS {name}_name')
+        where = []
+        params = []
+        if start_date is not None:
+            where.append('s.stat_date >= ?')
+            params.append(start_date)
+        if end_date is not None:
+            where.append('s.stat_date <= ?')
+            params.append(end_date)
+        for name, value in filters.items():
+            where.append(f's.{self.DIMENSIONS[name][0]} = ?')
+            params.append(value)
+
+        select += ['SUM(s.defect_count) AS defect_count', 'SUM(s.repaired_count) AS repaired_count']
+        sql = (f'SELECT {", ".join(select)} '
+               f'FROM defect_daily_stats s {" ".join(joins)} '
+               + (f'WHERE {" AND ".join(where)} ' if where else '')
+               + (f'GROUP BY {", ".join(group)} ORDER BY {", ".join(group)}' if group else ''))
+        return [dict(row) for row in self.db.conn.execute(sql, params).fetchall()]
+
+    def open_repair_cost_by_technician(self):
+        """      """
+        cursor = self.db.conn.execute('''
+            SELECT t.id AS technician_id, t.name, s.open_count, s.open_cost,
+                   s.completed_count, s.completed_cost
+            FROM technician_repair_stats s
+            JOIN technician t ON t.id = s.technician_id
+            ORDER BY s.open_cost DESC
+        ''')
+        return [dict(row) for row in cursor.fetchall()]
+
+
+class DefectExporter:
+    """     CSV, JSONL  Parquet  """
+
+    EXPORT_QUERY = '''
+        SELECT d.id, d.detection_date, d.created_at,
+               dv.id AS device_id, dv.imei, dv.serial_number,
+               sm.model_name, m.name AS manufacturer,
+               dt.name AS defect_type, dl.name AS location,
+               sl.level_name AS severity, sl.score AS severity_score,
+               d.length_mm, d.width_mm, d.depth_mm, d.description,
+               d.is_repaired, d.repair_date, d.repair_cost
+        FROM defect d
+        JOIN device dv ON dv.id = d.device_id
+        JOIN smartphone_model sm ON sm.id = dv.model_id
+        JOIN manufacturer m ON m.id = sm.manufacturer_id
+        JOIN defect_type dt ON dt.id = d.defect_type_id
+        JOIN defect_location dl ON dl.id = d.location_id
+        JOIN severity_level sl ON sl.id = d.severity_id
+        WHERE d.id > ?
+        ORDER BY d.id
+    '''
+
+    FORMATS = ('csv', 'jsonl', 'parquet')
+    WATERMARK_FILE = '.watermark.json'
+
+    def __init__(self, db_setup, out_dir, fmt='csv', chunk_size=10000):
+        if fmt not in self.FORMATS:
+            raise ValueError(f"  : {fmt}")
+        if fmt == 'parquet' and pa is None:
+            raise RuntimeError("   Parquet   pyarrow")
+        self.db = db_setup
+        self.out_dir = Path(out_dir)
+        self.fmt = fmt
+        self.chunk_size = chunk_size
+
+    def read_watermark(self):
+        """   """
+        path = self.out_dir / self.WATERMARK_FILE
+        if not path.exists():
+            return {'last_id': 0, 'last_created_at': None, 'files': {}}
+        return json.loads(path.read_text(encoding='utf-8'))
+
+    def _partition_files(self):
+        #    (CSV  JSONL)
+        if self.fmt == 'parquet':
+            return []
+        return sorted(self.out_dir.glob(f'detection_month=*/defects.{self.fmt}'))
+
+    def _rollback(self, sizes):
+        """      """
+        for path in self._partition_files():
+            size = sizes.get(path.relative_to(self.out_dir).as_posix())
+            if size is None:
+                path.unlink()  #   
+            elif path.stat().st_size > size:
+                with open(path, 'r+b') as f:
+                    f.truncate(size)
+
+    def _write_watermark(self, watermark):
+        path = self.out_dir / self.WATERMARK_FILE
+        tmp = path.with_suffix('.tmp')
+        tmp.write_text(json.dumps(watermark, ensure_ascii=False), encoding='utf-8')
+        os.replace(tmp, path)
+
+    @staticmethod
+    def _month(detection_date):
+        return detection_date[:7] if detection_date else 'unknown'
+
+    def export(self, incremental=True):
+        """  (      )"""
+        self.out_dir.mkdir(parents=True, exist_ok=True)
+        if incremental:
+            watermark = self.read_watermark()
+            #        
+            if 'files' in watermark:
+                self._rollback(watermark['files'])
+        else:
+            #        
+            pattern = 'part-*.parquet' if self.fmt == 'parquet' else f'defects.{self.fmt}'
+            for path in self.out_dir.glob(f'detection_month=*/{pattern}'):
+                path.unlink()
+            (self.out_dir / self.WATERMARK_FILE).unlink(missing_ok=True)
+            watermark = {'last_id': 0, 'last_created_at': None}
+        sizes = {path.relative_to(self.out_dir).as_posix(): path.stat().st_size
+                 for path in self._partition_files()}
+        started = time.perf_counter()
+        cursor = self.db.conn.cursor()
+        cursor.execute(self.EXPORT_QUERY, (watermark['last_id'],))
+        columns = [c[0] for c in cursor.description]
+        date_index = columns.index('detection_date')
+
+        writers = {}
+        files = []
+        total = 0
+        try:
+            while True:
+                rows = cursor.fetchmany(self.chunk_size)
+                if not rows:
+                    break
+                partitions = {}
+                for row in rows:
+                    partitions.setdefault(self._month(row[date_index]), []).append(tuple(row))
+                for month, part in partitions.items():
+                    if month not in writers:
+                        writers[month] = self._open_writer(month, columns, part[0][0])
+                        files.append(writers[month][0])
+                    self._write(writers[month], columns, part)
+                total += len(rows)
+                last = rows[-1]
+                watermark = {'last_id': last['id'], 'last_created_at': last['created_at']}
+                if self.fmt != 'parquet':
+                    #    :    
+                    #   ,      
+                    for path, f, _ in writers.values():
+                        f.flush()
+                        os.fsync(f.fileno())
+                        sizes[path.relative_to(self.out_dir).as_posix()] = f.tell()
+                    self._write_watermark(dict(watermark, files=sizes))
+        except Exception:
+            for writer in writers.values():
+                writer[1].close()
+                if self.fmt == 'parquet':
+                    writer[0].with_suffix('.tmp').unlink(missing_ok=True)
+            raise
+        for path, f, _ in writers.values():
+            f.close()
+            if self.fmt == 'parquet':
+                os.replace(path.with_suffix('.tmp'), path)
+
+        watermark['files'] = sizes
+        if total and self.fmt == 'parquet':
+            self._write_watermark(watermark)
+        elapsed = time.perf_counter() - started
+        print(f" : {total}  {len(files)} ()  {elapsed:.2f} ")
+        return {'rows': total, 'files': [str(f) for f in files], 'seconds': round(elapsed, 3),
+                'watermark': watermark}
+
+    def _open_writer(self, month, columns, first_id):
+        directory = self.out_dir / f'detection_month={month}'
+        directory.mkdir(exist_ok=True)
+        if self.fmt == 'csv':
+            path = directory / 'defects.csv'
+            is_new = not path.exists()
+            f = open(path, 'a', newline='', encoding='utf-8')
+            writer = csv.writer(f)
+            if is_new:
+                writer.writerow(columns)
+            return path, f, writer
+        if self.fmt == 'jsonl':
+            path = directory / 'defects.jsonl'
+            f = open(path, 'a', encoding='utf-8')
+            return path, f, None
+        # Parquet  ,     ;
+        #        
+        path = directory / f'part-{first_id:012d}.parquet'
+        writer = pq.ParquetWriter(str(path.with_suffix('.tmp')), self._arrow_schema(columns))
+        return path, writer, writer
+
+    @staticmethod
+    def _arrow_schema(columns):
+        types = {
+            'id': pa.int64(), 'device_id': pa.int64(), 'severity_score': pa.int64(),
+            'is_repaired': pa.int64(), 'length_mm': pa.float64(), 'width_mm': pa.float64(),
+            'depth_mm': pa.float64(), 'repair_cost': pa.float64(),
+        }
+        return pa.schema([(c, types.get(c, pa.string())) for c in columns])
+
+    def _write(self, writer, columns, rows):
+        path, f, handle = writer
+        if self.fmt == 'csv':
+            handle.writerows(rows)
+        elif self.fmt == 'jsonl':
+            for row in rows:
+                f.write(json.dumps(dict(zip(columns, row)), ensure_ascii=False) + '\n')
+        else:
+            batch = pa.RecordBatch.from_arrays(
+                [pa.array([row[i] for row in rows], type=handle.schema.field(i).type)
+                 for i in range(len(columns))],
+                schema=handle.schema
+            )
+            handle.write_batch(batch)
+
+
+class BackupManager:
+    """-   SQLite backup API  """
+
+    TIMESTAMP_FORMAT = '%Y%m%d_%H%M%S_%f'
+
+    def __init__(self, db_file="smartphone_defects.db", backup_dir=None, retention=7,
+                 pages=1024, sleep=0.005, compress=False, max_restarts=20):
+        self.db_file = db_file
+        db_path = Path(db_file)
+        self.backup_dir = Path(backup_dir) if backup_dir else db_path.parent / 'backups'
+        self.retention = retention
+        #       WAL;      
+        self.pages = pages
+        self.sleep = sleep
+        #         
+        self.max_restarts = max_restarts
+        self.compress = compress
+        self.prefix = db_path.stem
+
+    def _name(self, moment):
+        suffix = '.db.gz' if self.compress else '.db'
+        return f'{self.prefix}_{moment.strftime(self.TIMESTAMP_FORMAT)}{suffix}'
+
+    def _timestamp(self, path):
+        name = path.name[len(self.prefix) + 1:]
+        return datetime.strptime(name.split('.', 1)[0], self.TIMESTAMP_FORMAT)
+
+    def list_backups(self):
+        """   (, ),    """
+        if not self.backup_dir.exists():
+            return []
+        backups = []
+        for path in self.backup_dir.glob(f'{self.prefix}_*.db*'):
+            if path.name.endswith(('.db', '.db.gz')):
+                try:
+                    backups.append((self._timestamp(path), path))
+                except ValueError:
+                    continue
+        return sorted(backups)
+
+    @staticmethod
+    def verify(path):
+        """   (PRAGMA integrity_check)"""
+        conn = sqlite3.connect(f'file:{path}?mode=ro', uri=True)
+        try:
+            result = conn.execute('PRAGMA integrity_check').fetchall()
+        finally:
+            conn.close()
+        return [row[0] for row in result] == ['ok']
+
+    def backup(self):
+        """    ,     """
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        moment = datetime.now()
+        target = self.backup_dir / self._name(moment)
+        raw = target.with_name(target.name[:-3]) if self.compress else target
+        tmp = raw.with_suffix('.db.tmp')
+        progress = {'pages': 0, 'steps': 0, 'restarts': 0, 'remaining': None}
+
+        def on_progress(status, remaining, total):
+            #     ,    
+            if (status == sqlite3.SQLITE_OK and progress['remaining'] is not None
+                    and remaining >= progress['remaining']):
+                progress['restarts'] += 1
+                if progress['restarts'] > self.max_restarts:
+                    raise RuntimeError(
+                        f"    {self.max_restarts} ")
+            progress['remaining'] = remaining
+            progress['pages'] = total
+            progress['steps'] += 1
+            #       
+            if remaining and self.sleep:
+                time.sleep(self.sleep)
+
+        started = time.perf_counter()
+        src = sqlite3.connect(self.db_file)
+        dst = sqlite3.connect(tmp)
+        try:
+            #   WAL           
+            # ,        
+            wal = src.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+            src.backup(dst, pages=-1 if wal else self.pages, progress=on_progress,
+                       sleep=self.sleep)
+        except Exception:
+            dst.close()
+            tmp.unlink(missing_ok=True)
+            raise
+        finally:
+            dst.close()
+            src.close()
+        copied = time.perf_counter()
+
+        if not self.verify(tmp):
+            tmp.unlink()
+            raise RuntimeError(f"  {target}    ")
+        verified = time.perf_counter()
+
+        if self.compress:
+            with open(tmp, 'rb') as f_in, gzip.open(target, 'wb', compresslevel=6) as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+            tmp.unlink()
+        else:
+            os.replace(tmp, target)
+        finished = time.perf_counter()
+
+        removed = self.rotate()
+        metrics = {
+            'path': str(target),
+            'pages': progress['pages'],
+            'steps': progress['steps'],
+            'restarts': progress['restarts'],
+            'bytes': target.stat().st_size,
+            'copy_seconds': round(copied - started, 3),
+            'verify_seconds': round(verified - copied, 3),
+            'compress_seconds': round(finished - verified, 3),
+            'total_seconds': round(finished - started, 3),
+            'removed': [str(p) for p in removed],
+        }
+        print(f"  : {target} ({metrics['total_seconds']} )")
+        return metrics
+
+    def rotate(self):
+        """    retention"""
+        backups = self.list_backups()
+        removed = []
+        for _, path in backups[:max(len(backups) - self.retention, 0)]:
+            path.unlink()
+            removed.append(path)
+        return removed
+
+    def restore(self, backup_path=None, at=None):
+        """   : ,    at  """
+        if backup_path is None:
+            candidates = [b for b in self.list_backups() if at is None or b[0] <= at]
+            if not candidates:
+                raise FileNotFoundError("     ")
+            backup_path = candidates[-1][1]
+        backup_path = Path(backup_path)
+
+        started = time.perf_counter()
+        source = backup_path
+        if backup_path.suffix == '.gz':
+            source = backup_path.with_suffix('.restore')
+            with gzip.open(backup_path, 'rb') as f_in, open(source, 'wb') as f_out:
+                shutil.copyfileobj(f_in, f_out, 1024 * 1024)
+        try:
+            if not self.verify(source):
+                raise RuntimeError(f"  {backup_path} ")
+            #   backup API   WAL   
+            src = sqlite3.connect(source)
+            dst = sqlite3.connect(self.db_file)
+            try:
+                src.backup(dst, pages=self.pages, sleep=self.sleep)
+            finally:
+                dst.close()
+                src.close()
+        finally:
+            if source != backup_path:
+                source.unlink()
+        elapsed = time.perf_counter() - started
+        print(f"    {backup_path}  {elapsed:.2f} ")
+        return {'path': str(backup_path), 'seconds': round(elapsed, 3)}
+
+
+class MigrationManager:
+    """    PRAGMA user_version"""
+
+    #  -> (, ). :
+    #   ('add_column', ,  )
+    #   ('replace_column', ,  ,  )
+    #   ('sql', )
+    MIGRATIONS = [
+        (1, ' :     defect_image', [
+            ('add_column', 'defect_image', 'image_hash TEXT'),
+            ('add_column', 'defect_image', 'image_size INTEGER'),
+            ('sql', '''
+            CREATE TABLE IF NOT EXISTS image_blob (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                hash TEXT NOT NULL UNIQUE,
+                size INTEGER NOT NULL,
+                data BLOB NOT NULL,
+                created_at DATETIME DEFAULT CURRENT_TIMESTAMP
+            )
+            '''),
+            ('sql', 'CREATE INDEX IF NOT EXISTS idx_defect_image_hash ON defect_image (image_hash)'),
+        ]),
+    ]
+
+    #       
+    ROWS_PER_SECOND = 100000
+    CONSTRAINT_PREFIXES = ('CONSTRAINT', 'PRIMARY KEY', 'UNIQUE', 'CHECK', 'FOREIGN KEY')
+
+    def __init__(self, db_setup, migrations=None):
+        self.db = db_setup
+        self.migrations = sorted(migrations if migrations is not None else self.MIGRATIONS,
+                                 key=lambda m: m[0])
+
+    @property
+    def latest_version(self):
+        return self.migrations[-1][0] if self.migrations else 0
+
+    def current_version(self):
+        """   """
+        return self.db.conn.execute('PRAGMA user_version').fetchone()[0]
+
+    def stamp(self, version=None):
+        """      (  )"""
+        version = self.latest_version if version is None else version
+        self.db.conn.execute(f'PRAGMA user_version = {int(version)}')
+        self.db.conn.commit()
+
+    def _table_sql(self, table):
+        row = self.db.conn.execute(
+            "SELECT sql FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)
+        ).fetchone()
+        if row is None:
+            raise ValueError(f" {table}  ")
+        return row[0]
+
+    def _columns(self, table):
+        return [row[1] for row in self.db.conn.execute(f'PRAGMA table_info({table})')]
+
+    @staticmethod
+    def _split_definition(sql):
+        """ CREATE TABLE      """
+        start = sql.index('(')
+        end = sql.rindex(')')
+        items, depth, current = [], 0, ''
+        for ch in sql[start + 1:end]:
+            if ch == '(':
+                depth += 1
+            elif ch == ')':
+                depth -= 1
+            if ch == ',' and depth == 0:
+                items.append(current.strip())
+                current = ''
+            else:
+                current += ch
+        if current.strip():
+            items.append(current.strip())
+        return sql[:start], items, sql[end + 1:]
+
+    def _can_alter_add(self, column_def):
+        # ADD COLUMN   UNIQUE/PRIMARY KEY  NOT NULL    
+        upper = column_def.upper()
+        if 'UNIQUE' in upper or 'PRIMARY KEY' in upper:
+            return False
+        if 'NOT NULL' in upper and 'DEFAULT' not in upper:
+            return False
+        return True
+
+    def _rebuilt_sql(self, table, step):
+        _, items, tail = self._split_definition(self._table_sql(table))
+        if step[0] == 'add_column':
+            position = next((i for i, item in enumerate(items)
+                             if item.upper().startswith(self.CONSTRAINT_PREFIXES)), len(items))
+            items.insert(position, step[2])
+        else:
+            name = step[2]
+            for i, item in enumerate(items):
+                if item.split()[0].strip('"[]`') == name:
+                    items[i] = step[3]
+                    break
+            else:
+                raise ValueError(f" {table}.{name}  ")
+        body = ',\n            '.join(items)
+        return f'CREATE TABLE {{name}} (\n            {body}\n        ){tail}'
+
+    def _row_count(self, table):
+        return self.db.conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+
+    def plan(self, target=None):
+        """        """
+        target = self.latest_version if target is None else target
+        current = self.current_version()
+        steps = []
+        for version, description, migration_steps in self.migrations:
+            if not current < version <= target:
+                continue
+            for step in migration_steps:
+                entry = {'version': version, 'description': description, 'step': step}
+                if step[0] == 'sql':
+                    entry.update(method='sql', table=None, estimated_seconds=0.01)
+                elif step[0] == 'add_column':
+                    table = step[1]
+                    column = step[2].split()[0]
+                    if column in self._columns(table):
+                        entry.update(method='skip', table=table, estimated_seconds=0.0)
+                    elif self._can_alter_add(step[2]):
+                        entry.update(method='alter', table=table, estimated_seconds=0.01)
+                    else:
+                        entry.update(method='rebuild', table=table)
+                elif step[0] == 'replace_column':
+                    entry.update(method='rebuild', table=step[1])
+                else:
+                    raise ValueError(f"  : {step[0]}")
+                if entry['method'] == 'rebuild':
+                    rows = self._row_count(entry['table'])
+                    entry['estimated_seconds'] = round(rows / self.ROWS_PER_SECOND, 3)
+                steps.append(entry)
+        return steps
+
+    def migrate(self, target=None, batch_size=10000):
+        """    target,    """
+        target = self.latest_version if target is None else target
+        conn = self.db.conn
+        plan = self.plan(target)
+        report = []
+        for i, entry in enumerate(plan):
+            started = time.perf_counter()
+            step = entry['step']
+            if entry['method'] == 'sql':
+                conn.execute(step[1])
+                conn.commit()
+            elif entry['method'] == 'alter':
+                conn.execute(f'ALTER TABLE {step[1]} ADD COLUMN {step[2]}')
+                conn.commit()
+            elif entry['method'] == 'rebuild':
+                self._rebuild_table(entry['table'], self._rebuilt_sql(entry['table'], step),
+                                    batch_size)
+            entry['actual_seconds'] = round(time.perf_counter() - started, 3)
+            report.append(entry)
+            print(f" {entry['version']}: {entry['method']} {entry['table'] or ''} "
+                  f"( {entry['estimated_seconds']} ,  {entry['actual_seconds']} )")
+            #       
+            if i + 1 == len(plan) or plan[i + 1]['version'] != entry['version']:
+                self.stamp(entry['version'])
+        if target > self.current_version():
+            self.stamp(target)
+        return report
+
+    def _drop_rebuild_state(self, table):
+        """ ,        """
+        conn = self.db.conn
+        changes = f'{table}__migrate_changes'
+        #            
+        for operation in ('insert', 'update', 'delete'):
+            conn.execute(f'DROP TRIGGER IF EXISTS {changes}_{operation}')
+        conn.execute(f'DROP TABLE IF EXISTS {changes}')
+        conn.execute(f'DROP TABLE IF EXISTS {table}__migrate')
+        conn.commit()
+
+    def _rebuild_table(self, table, create_sql, batch_size):
+        """      """
+        conn = self.db.conn
+        new_table = f'{table}__migrate'
+        old_columns = self._columns(table)
+        #       ,   
+        dependents = [row[0] for row in conn.execute(
+            "SELECT sql FROM sqlite_master WHERE tbl_name = ? AND type IN ('index', 'trigger') "
+            "AND sql IS NOT NULL", (table,)
+        )]
+        if conn.in_transaction:
+            conn.commit()
+        changes = f'{table}__migrate_changes'
+        conn.execute(f'DROP TABLE IF EXISTS {new_table}')
+        conn.execute(create_sql.format(name=new_table))
+        #   (    )  id
+        # ,      ,   
+        conn.execute(f'DROP TABLE IF EXISTS {changes}')
+        conn.execute(f'CREATE TABLE {changes} (id INTEGER PRIMARY KEY)')
+        for operation, rows in (('insert', ('NEW',)), ('update', ('OLD', 'NEW')),
+                                ('delete', ('OLD',))):
+            body = ' '.join(f'INSERT OR IGNORE INTO {changes} VALUES ({row}.id);' for row in rows)
+            conn.execute(f'CREATE TRIGGER {changes}_{operation} AFTER {operation.upper()} '
+                         f'ON {table} BEGIN {body} END')
+        conn.commit()
+        columns = ', '.join(c for c in old_columns if c in self._columns(new_table))
+
+        try:
+            last_id = 0
+            while True:
+                conn.execute('BEGIN IMMEDIATE')
+                cursor = conn.execute(
+                    f'INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table} '
+                    f'WHERE id > ? ORDER BY id LIMIT ?', (last_id, batch_size)
+                )
+                copied = cursor.rowcount
+                if copied:
+                    last_id = conn.execute(f'SELECT MAX(id) FROM {new_table}').fetchone()[0]
+                conn.commit()
+                if copied < batch_size:
+                    break
+        except Exception:
+            if conn.in_transaction:
+                conn.rollback()
+            self._drop_rebuild_state(table)
+            raise
+
+        foreign_keys = conn.execute('PRAGMA foreign_keys').fetchone()[0]
+        conn.execute('PRAGMA foreign_keys = OFF')
+        #            
+        conn.execute('PRAGMA legacy_alter_table = ON')
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                # , ,      
+                # ;    
+                conn.execute(f'DELETE FROM {new_table} WHERE id IN (SELECT id FROM {changes})')
+                conn.execute(f'INSERT INTO {new_table} ({columns}) SELECT {columns} FROM {table} '
+                             f'WHERE id > ? OR id IN (SELECT id FROM {changes})', (last_id,))
+                conn.execute(f'DROP TABLE {table}')
+                conn.execute(f'DROP TABLE {changes}')
+                conn.execute(f'ALTER TABLE {new_table} RENAME TO {table}')
+                for sql in dependents:
+                    conn.execute(sql)
+                violations = conn.execute(f'PRAGMA foreign_key_check({table})').fetchall()
+                if violations:
+                    raise RuntimeError(f"     {table}")
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                self._drop_rebuild_state(table)
+                raise
+        finally:
+            conn.execute('PRAGMA legacy_alter_table = OFF')
+            conn.execute(f'PRAGMA foreign_keys = {foreign_keys}')
+
+
+class DataGenerator:
+    """     """
+
+    SCALES = {
+        'small': {'devices': 1000, 'defects_per_device': 3.0},
+        'medium': {'devices': 100000, 'defects_per_device': 3.0},
+        'large': {'devices': 1000000, 'defects_per_device': 3.0},
+        'production': {'devices': 3300000, 'defects_per_device': 3.0},
+    }
+
+    #   (   score)
+    SEVERITY_WEIGHTS = (35, 30, 20, 10, 5)
+    REPAIR_STATUSES = (('completed', 60), ('in_progress', 15), ('pending', 12),
+                       ('on_hold', 8), ('cancelled', 5))
+    PRIORITIES = ('low', 'medium', 'high', 'critical')
+    COLORS = ('', '', '', '', '', '')
+    START_DATE = datetime(2023, 1, 1)
+
+    DIAGNOSIS_COLUMNS = ('defect_id', 'technician_id', 'diagnosis_date', 'conclusion',
+                         'recommended_action', 'estimated_cost', 'estimated_time_hours',
+                         'priority')
+    REPAIR_COLUMNS = ('defect_id', 'technician_id', 'start_date', 'end_date', 'repair_type',
+                      'cost', 'status', 'parts_used', 'labor_hours', 'warranty_until', 'notes')
+    IMAGE_COLUMNS = ('defect_id', 'image_path', 'capture_date', 'is_verified')
+
+    def __init__(self, db_setup, seed=42, chunk_devices=5000):
+        self.db = db_setup
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.chunk_devices = chunk_devices
+
+    @staticmethod
+    def luhn_digit(body):
+        """     IMEI  14 """
+        total = 0
+        for i, ch in enumerate(reversed(body)):
+            d = int(ch)
+            if i % 2 == 0:
+                d *= 2
+                if d > 9:
+                    d -= 9
+            total += d
+        return str((10 - total % 10) % 10)
+
+    def _ids(self, table):
+        return [row[0] for row in self.db.conn.execute(f'SELECT id FROM {table} ORDER BY id')]
+
+    def _next_id(self, table):
+        return self.db.conn.execute(f'SELECT IFNULL(MAX(id), 0) FROM {table}').fetchone()[0] + 1
+
+    def _date(self, days):
+        moment = self.START_DATE + timedelta(days=self.random.random() * days)
+        return moment.strftime('%Y-%m-%d %H:%M:%S')
+
+    @staticmethod
+    def _shift(moment, hours):
+        shifted = datetime.strptime(moment, '%Y-%m-%d %H:%M:%S') + timedelta(hours=hours)
+        return shifted.strftime('%Y-%m-%d %H:%M:%S')
+
+    def _insert(self, table, columns, rows):
+        if rows:
+            self.db.conn.executemany(
+                f'INSERT INTO {table} ({", ".join(columns)}) '
+                f'VALUES ({", ".join("?" * len(columns))})',
+                rows
+            )
+        return len(rows)
+
+    def generate(self, scale='small', days=365, **overrides):
+        """ , , ,   """
+        params = dict(self.SCALES[scale])
+        params.update(overrides)
+        started = time.perf_counter()
+        rnd = self.random
+        conn = self.db.conn
+
+        models = self._ids('smartphone_model')
+        defect_types = self._ids('defect_type')
+        locations = self._ids('defect_location')
+        severities = self._ids('severity_level')
+        technicians = self._ids('technician')
+        users = self._ids('app_user') or [None]
+        if not (models and defect_types and locations and severities and technicians):
+            raise RuntimeError(" :   insert_sample_data")
+        severity_weights = list(self.SEVERITY_WEIGHTS[:len(severities)])
+        severity_weights += [1] * (len(severities) - len(severity_weights))
+        # ,    
+        location_weights = [rnd.randint(1, 10) for _ in locations]
+        statuses, status_weights = zip(*self.REPAIR_STATUSES)
+
+        counts = {'device': 0, 'defect': 0, 'diagnosis': 0, 'repair': 0, 'defect_image': 0}
+        device_id = self._next_id('device')
+        defect_id = self._next_id('defect')
+        remaining = params['devices']
+        while remaining > 0:
+            chunk = min(remaining, self.chunk_devices)
+            devices, defects, diagnoses, repairs, images = [], [], [], [], []
+            for _ in range(chunk):
+                body = f'86{device_id:012d}'
+                produced = self.START_DATE - timedelta(days=rnd.randint(30, 720))
+                devices.append((
+                    device_id, rnd.choice(models), body + self.luhn_digit(body),
+                    f'GN{self.seed:04d}{device_id:010d}', rnd.choice(self.COLORS),
+                    produced.strftime('%Y-%m-%d'),
+                    (produced + timedelta(days=rnd.randint(1, 90))).strftime('%Y-%m-%d'),
+                    (produced + timedelta(days=730)).strftime('%Y-%m-%d'), None
+                ))
+                for _ in range(int(rnd.expovariate(1 / params['defects_per_device']) + 0.5)):
+                    detected = self._date(days)
+                    status = None
+                    if rnd.random() < 0.7:
+                        diagnoses.append((defect_id, rnd.choice(technicians), detected,
+                                          ' ', ' ',
+                                          round(rnd.uniform(500, 20000), 2), rnd.randint(1, 8),
+                                          rnd.choice(self.PRIORITIES)))
+                        if rnd.random() < 0.6:
+                            status = rnd.choices(statuses, status_weights)[0]
+                            #      : ,
+                            #   4.5  2.7    
+                            started_at = self._shift(detected, rnd.lognormvariate(1.5, 1.0))
+                            finished_at = (self._shift(started_at, rnd.lognormvariate(1.0, 0.8))
+                                           if status == 'completed' else None)
+                            repairs.append((defect_id, rnd.choice(technicians), started_at,
+                                            finished_at,
+                                            ' ',
+                                            round(rnd.uniform(500, 20000), 2), status, None,
+                                            round(rnd.uniform(0.5, 6), 1), None, None))
+                    for shot in range(rnd.choice((0, 1, 1, 2))):
+                        images.append((defect_id, f'images/gen_{defect_id}_{shot}.jpg',
+                                       detected, rnd.random() < 0.8))
+                    repaired = status == 'completed'
+                    defects.append((
+                        defect_id, device_id, rnd.choice(defect_types),
+                        rnd.choices(locations, location_weights)[0],
+                        rnd.choices(severities, severity_weights)[0], rnd.choice(users),
+                        detected, round(rnd.uniform(0.5, 60), 2), round(rnd.uniform(0.01, 5), 2),
+                        round(rnd.uniform(0.001, 0.5), 3), ' ',
+                        int(repaired), finished_at if repaired else None, None
+                    ))
+                    defect_id += 1
+                device_id += 1
+
+            #         
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                counts['device'] += self._insert(
+                    'device', ('id',) + BulkLoader.DEVICE_COLUMNS, devices)
+                counts['defect'] += self._insert(
+                    'defect', ('id',) + BulkLoader.DEFECT_COLUMNS, defects)
+                counts['diagnosis'] += self._insert('diagnosis', self.DIAGNOSIS_COLUMNS, diagnoses)
+                counts['repair'] += self._insert('repair', self.REPAIR_COLUMNS, repairs)
+                counts['defect_image'] += self._insert('defect_image', self.IMAGE_COLUMNS, images)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+            remaining -= chunk
+
+        elapsed = time.perf_counter() - started
+        print(f"  {elapsed:.1f} : {counts}")
+        return counts
+
+
+class Benchmark:
+    """      """
+
+    OPEN_STATUSES = ('pending', 'in_progress', 'on_hold')
+
+    def __init__(self, db_setup, seed=42):
+        self.db = db_setup
+        self.seed = seed
+        self.random = random.Random(seed)
+        self.results = {}
+
+    @staticmethod
+    def percentiles(samples):
+        """   """
+        ordered = sorted(samples)
+        if not ordered:
+            return {}
+
+        def pick(p):
+            #   
+            return ordered[max(0, math.ceil(p * len(ordered) / 100) - 1)]
+
+        return {
+            'count': len(ordered),
+            'mean_ms': round(sum(ordered) / len(ordered) * 1000, 4),
+            'p50_ms': round(pick(50) * 1000, 4),
+            'p90_ms': round(pick(90) * 1000, 4),
+            'p95_ms': round(pick(95) * 1000, 4),
+            'p99_ms': round(pick(99) * 1000, 4),
+            'max_ms': round(ordered[-1] * 1000, 4),
+        }
+
+    def _measure(self, name, operation, args_list):
+        samples = []
+        started = time.perf_counter()
+        for args in args_list:
+            t0 = time.perf_counter()
+            operation(*args)
+            samples.append(time.perf_counter() - t0)
+        elapsed = time.perf_counter() - started
+        stats = self.percentiles(samples)
+        stats['ops_per_second'] = round(len(samples) / elapsed, 1) if elapsed > 0 else None
+        self.results[name] = stats
+        return stats
+
+    def run(self, iterations=1000):
+        """     """
+        conn = self.db.conn
+        rnd = self.random
+        imeis = [row[0] for row in conn.execute(
+            'SELECT imei FROM device WHERE imei IS NOT NULL ORDER BY id')]
+        device_ids = [row[0] for row in conn.execute('SELECT id FROM device ORDER BY id')]
+        technicians = [row[0] for row in conn.execute('SELECT id FROM technician ORDER BY id')]
+        months = [row[0] for row in conn.execute(
+            "SELECT DISTINCT strftime('%Y-%m', detection_date) FROM defect ORDER BY 1")]
+        if not device_ids:
+            raise RuntimeError("    ")
+
+        def insert_defect(device_id):
+            conn.execute(
+                'INSERT INTO defect (device_id, defect_type_id, location_id, severity_id, '
+                'detection_date, description) VALUES (?, 1, 1, 1, CURRENT_TIMESTAMP, ?)',
+                (device_id, ' ')
+            )
+            conn.commit()
+
+        def lookup_imei(imei):
+            conn.execute('SELECT * FROM device WHERE imei = ?', (imei,)).fetchone()
+
+        def device_history(device_id):
+            conn.execute('''
+                SELECT d.id, d.detection_date, dg.conclusion, r.status, r.cost
+                FROM defect d
+                LEFT JOIN diagnosis dg ON dg.defect_id = d.id
+                LEFT JOIN repair r ON r.defect_id = d.id
+                WHERE d.device_id = ?
+                ORDER BY d.detection_date
+            ''', (device_id,)).fetchall()
+
+        def open_repair_queue(technician_id):
+            conn.execute(f'''
+                SELECT id, defect_id, start_date FROM repair
+                WHERE status IN ({", ".join("?" * len(self.OPEN_STATUSES))})
+                  AND technician_id = ?
+                ORDER BY start_date LIMIT 50
+            ''', self.OPEN_STATUSES + (technician_id,)).fetchall()
+
+        def aggregate_report(month):
+            conn.execute('''
+                SELECT m.name, sl.level_name, COUNT(*)
+                FROM defect d
+                JOIN device dv ON dv.id = d.device_id
+                JOIN smartphone_model sm ON sm.id = dv.model_id
+                JOIN manufacturer m ON m.id = sm.manufacturer_id
+                JOIN severity_level sl ON sl.id = d.severity_id
+                WHERE d.detection_date >= ? || '-01' AND d.detection_date < date(? || '-01', '+1 month')
+                GROUP BY m.name, sl.level_name
+            ''', (month, month)).fetchall()
+
+        self.results = {}
+        self._measure('lookup_imei', lookup_imei,
+                      [(rnd.choice(imeis),) for _ in range(iterations)] if imeis else [])
+        self._measure('device_history', device_history,
+                      [(rnd.choice(device_ids),) for _ in range(iterations)])
+        if technicians:
+            self._measure('open_repair_queue', open_repair_queue,
+                          [(rnd.choice(technicians),) for _ in range(iterations)])
+        if months:
+            self._measure('aggregate_report', aggregate_report,
+                          [(rnd.choice(months),) for _ in range(max(iterations // 20, 1))])
+        self._measure('insert_defect', insert_defect,
+                      [(rnd.choice(device_ids),) for _ in range(iterations)])
+        return self.results
+
+    def report(self):
+        """      """
+        conn = self.db.conn
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'sqlite_version': sqlite3.sqlite_version,
+            'seed': self.seed,
+            'profile': self.db.profile,
+            'row_counts': {table: conn.execute(f'SELECT COUNT(*) FROM {table}').fetchone()[0]
+                           for table in ('device', 'defect', 'diagnosis', 'repair', 'defect_image')},
+            'results': self.results,
+        }
+
+    def to_json(self, path):
+        """   JSON"""
+        data = self.report()
+        Path(path).write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        return data
+
+
+class QueryMonitor:
+    """ : ,  , , """
+
+    #     , 
+    BUCKETS_MS = (0.1, 0.5, 1, 5, 10, 50, 100, 500, 1000, float('inf'))
+
+    def __init__(self, db_setup, slow_threshold=0.1, max_duration=None,
+                 progress_steps=10000, slow_log_size=100):
+        self.db = db_setup
+        self.slow_threshold = slow_threshold  # 
+        self.max_duration = max_duration  # ; None -  
+        self.progress_steps = progress_steps
+        self.stats_by_sql = {}
+        self.slow_queries = deque(maxlen=slow_log_size)
+        self.runaway_queries = deque(maxlen=slow_log_size)
+        self.traced = Counter()
+        self._lock = threading.Lock()
+        self._current = None
+        self._raw_conn = None
+        self._raw_cursor = None
+        self._dump_timer = None
+
+    @staticmethod
+    def normalize(sql):
+        """ SQL  :    ?,  """
+        sql = re.sub(r"'(?:[^']|'')*'", '?', sql)
+        sql = re.sub(r'\b\d+(?:\.\d+)?\b', '?', sql)
+        sql = re.sub(r'\(\s*\?(?:\s*,\s*\?)+\s*\)', '(?+)', sql)
+        sql = re.sub(r'--[^\n]*', '', sql)
+        return ' '.join(sql.split())
+
+    def install(self):
+        """    DatabaseSetup  """
+        if self._raw_conn is not None:
+            return
+        self._raw_conn = self.db.conn
+        self._raw_cursor = self.db.cursor
+        self._raw_conn.set_trace_callback(self._trace)
+        if self.max_duration is not None:
+            self._raw_conn.set_progress_handler(self._progress, self.progress_steps)
+        self.db.conn = InstrumentedConnection(self._raw_conn, self)
+        self.db.cursor = InstrumentedCursor(self._raw_cursor, self)
+
+    def progress_handler(self):
+        """       """
+        if self._raw_conn is None or self.max_duration is None:
+            return None, 0
+        return self._progress, self.progress_steps
+
+    def uninstall(self):
+        """    """
+        if self._raw_conn is None:
+            return
+        self.stop_periodic_dump()
+        self._raw_conn.set_trace_callback(None)
+        self._raw_conn.set_progress_handler(None, 0)
+        self.db.conn = self._raw_conn
+        self.db.cursor = self._raw_cursor
+        self._raw_conn = None
+        self._raw_cursor = None
+
+    def _trace(self, statement):
+        #   ,  COMMIT   
+        with self._lock:
+            self.traced[self.normalize(statement)] += 1
+
+    def _progress(self):
+        current = self._current
+        if current is not None and time.perf_counter() - current[1] > self.max_duration:
+            with self._lock:
+                self.runaway_queries.append({
+                    'sql': current[0],
+                    'seconds': round(time.perf_counter() - current[1], 3),
+                    'at': datetime.now().isoformat(timespec='seconds'),
+                })
+            return 1  #   (sqlite3.OperationalError: interrupted)
+        return 0
+
+    def _entry(self, key):
+        entry = self.stats_by_sql.get(key)
+        if entry is None:
+            entry = self.stats_by_sql[key] = {
+                'count': 0, 'total_seconds': 0.0, 'max_seconds': 0.0,
+                'rows_affected': 0, 'rows_returned': 0, 'errors': 0,
+                'histogram': [0] * len(self.BUCKETS_MS),
+            }
+        return entry
+
+    def run(self, operation, sql, params=None):
+        """     """
+        key = self.normalize(sql)
+        started = time.perf_counter()
+        self._current = (sql, started)
+        try:
+            result = operation()
+        except Exception:
+            with self._lock:
+                self._entry(key)['errors'] += 1
+            raise
+        finally:
+            self._current = None
+        elapsed = time.perf_counter() - started
+        rowcount = getattr(result, 'rowcount', -1)
+        with self._lock:
+            entry = self._entry(key)
+            entry['count'] += 1
+            entry['total_seconds'] += elapsed
+            entry['max_seconds'] = max(entry['max_seconds'], elapsed)
+            if rowcount > 0:
+                entry['rows_affected'] += rowcount
+            ms = elapsed * 1000
+            bucket = next(i for i, bound in enumerate(self.BUCKETS_MS) if ms <= bound)
+            entry['histogram'][bucket] += 1
+        if elapsed >= self.slow_threshold:
+            self._log_slow(sql, params, elapsed)
+        return result, key
+
+    def count_rows(self, key, rows):
+        if key is not None and rows:
+            with self._lock:
+                self._entry(key)['rows_returned'] += rows
+
+    def _log_slow(self, sql, params, elapsed):
+        plan = []
+        if params is not None and not isinstance(params, (list, tuple, dict)):
+            params = None
+        try:
+            cursor = self._raw_conn.execute(f'EXPLAIN QUERY PLAN {sql}', params or ())
+            plan = [row[3] for row in cursor.fetchall()]
+        except sqlite3.Error:
+            pass  # executemany,    PRAGMA   
+        record = {
+            'sql': ' '.join(sql.split()),
+            'seconds': round(elapsed, 4),
+            'plan': plan,
+            'at': datetime.now().isoformat(timespec='seconds'),
+        }
+        with self._lock:
+            self.slow_queries.append(record)
+        print(f"  ({record['seconds']} ): {record['sql'][:200]}")
+
+    def stats(self, top=None):
+        """   ,    """
+        with self._lock:
+            items = sorted(self.stats_by_sql.items(), key=lambda kv: kv[1]['total_seconds'],
+                           reverse=True)
+            result = {}
+            for key, entry in items[:top]:
+                entry = dict(entry, histogram=dict(zip(
+                    [f'<={b}ms' if b != float('inf') else '>1000ms' for b in self.BUCKETS_MS],
+                    entry['histogram'])))
+                entry['mean_ms'] = round(entry['total_seconds'] / entry['count'] * 1000, 4) \
+                    if entry['count'] else 0.0
+                result[key] = entry
+            return result
+
+    def snapshot(self):
+        """    """
+        with self._lock:
+            slow = list(self.slow_queries)
+            runaway = list(self.runaway_queries)
+            traced = dict(self.traced.most_common(50))
+        return {
+            'timestamp': datetime.now().isoformat(timespec='seconds'),
+            'queries': self.stats(),
+            'slow_queries': slow,
+            'runaway_queries': runaway,
+            'traced_statements': traced,
+        }
+
+    def reset(self):
+        """  """
+        with self._lock:
+            self.stats_by_sql.clear()
+            self.slow_queries.clear()
+            self.runaway_queries.clear()
+            self.traced.clear()
+
+    def dump(self, path):
+        """    JSON"""
+        data = self.snapshot()
+        tmp = Path(f'{path}.tmp')
+        tmp.write_text(json.dumps(data, ensure_ascii=False, indent=2), encoding='utf-8')
+        os.replace(tmp, path)
+        return data
+
+    def start_periodic_dump(self, path, interval=60.0):
+        """       """
+        def tick():
+            self.dump(path)
+            self._dump_timer = threading.Timer(interval, tick)
+            self._dump_timer.daemon = True
+            self._dump_timer.start()
+
+        self.stop_periodic_dump()
+        self._dump_timer = threading.Timer(interval, tick)
+        self._dump_timer.daemon = True
+        self._dump_timer.start()
+
+    def stop_periodic_dump(self):
+        if self._dump_timer is not None:
+            self._dump_timer.cancel()
+            self._dump_timer = None
+
+
+class InstrumentedCursor:
+    """ ,    QueryMonitor"""
+
+    def __init__(self, cursor, monitor):
+        self._cursor = cursor
+        self._monitor = monitor
+        self._key = None
+
+    def execute(self, sql, params=()):
+        _, self._key = self._monitor.run(lambda: self._cursor.execute(sql, params), sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        _, self._key = self._monitor.run(lambda: self._cursor.executemany(sql, seq_of_params), sql)
+        return self
+
+    def executescript(self, script):
+        _, self._key = self._monitor.run(lambda: self._cursor.executescript(script), script)
+        return self
+
+    def fetchone(self):
+        row = self._cursor.fetchone()
+        self._monitor.count_rows(self._key, 1 if row is not None else 0)
+        return row
+
+    def fetchmany(self, size=None):
+        rows = self._cursor.fetchmany(size if size is not None else self._cursor.arraysize)
+        self._monitor.count_rows(self._key, len(rows))
+        return rows
+
+    def fetchall(self):
+        rows = self._cursor.fetchall()
+        self._monitor.count_rows(self._key, len(rows))
+        return rows
+
+    def __iter__(self):
+        for row in self._cursor:
+            self._monitor.count_rows(self._key, 1)
+            yield row
+
+    def __getattr__(self, name):
+        return getattr(self._cursor, name)
+
+
+class InstrumentedConnection:
+    """ : execute/executemany/cursor   QueryMonitor"""
+
+    def __init__(self, conn, monitor):
+        self._conn = conn
+        self._monitor = monitor
+
+    def cursor(self, *args, **kwargs):
+        return InstrumentedCursor(self._conn.cursor(*args, **kwargs), self._monitor)
+
+    def execute(self, sql, params=()):
+        return self.cursor().execute(sql, params)
+
+    def executemany(self, sql, seq_of_params):
+        return self.cursor().executemany(sql, seq_of_params)
+
+    def executescript(self, script):
+        return self.cursor().executescript(script)
+
+    def __enter__(self):
+        self._conn.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._conn.__exit__(*exc)
+
+    def __getattr__(self, name):
+        return getattr(self._conn, name)
+
+
+class DefectSearch:
+    """  FTS5   , ,   """
+
+    TEXT_COLUMNS = ('description', 'conclusion', 'recommended_action', 'repair_notes',
+                    'parts_used', 'verification_notes')
+    #    bm25; facets -   ,    
+    WEIGHTS = (4.0, 3.0, 2.0, 2.0, 1.0, 1.0, 0.0)
+
+    #         (   )
+    RUSSIAN_ENDINGS = ('', '', '', '', '', '', '', '', '', '',
+                       '', '', '', '', '', '', '', '', '', '', '', '',
+                       '', '', '', '', '', '', '', '', '', '', '', '', '',
+                       '', '')
+
+    @staticmethod
+    def _fold(expression):
+        # unicode61     ,   
+        return f"replace(replace({expression}, '', ''), '', '')"
+
+    def __init__(self, db_setup):
+        self.db = db_setup
+
+    def _content_view(self):
+        def concat(column, table):
+            return (f"(SELECT group_concat({column}, ' ') FROM "
+                    f"(SELECT {column} FROM {table} WHERE defect_id = d.id ORDER BY id))")
+
+        return f'''
+        CREATE VIEW IF NOT EXISTS defect_search_content AS
+        SELECT d.id AS defect_id,
+               {self._fold('d.description')} AS description,
+               {self._fold(concat('conclusion', 'diagnosis'))} AS conclusion,
+               {self._fold(concat('recommended_action', 'diagnosis'))} AS recommended_action,
+               {self._fold(concat('notes', 'repair'))} AS repair_notes,
+               {self._fold(concat('parts_used', 'repair'))} AS parts_used,
+               {self._fold(concat('verification_notes', 'defect_image'))} AS verification_notes,
+               'model' || dv.model_id || ' manufacturer' || sm.manufacturer_id
+                   || ' severity' || d.severity_id AS facets
+        FROM defect d
+        JOIN device dv ON dv.id = d.device_id
+        JOIN smartphone_model sm ON sm.id = dv.model_id
+        '''
+
+    def _reindex(self, condition):
+        #  :        
+        columns = ', '.join(self.TEXT_COLUMNS + ('facets',))
+        delete = (f"INSERT INTO defect_fts (defect_fts, rowid, {columns}) "
+                  f"SELECT 'delete', defect_id, {columns} FROM defect_search_content "
+                  f"WHERE {condition};")
+        insert = (f"INSERT INTO defect_fts (rowid, {columns}) "
+                  f"SELECT defect_id, {columns} FROM defect_search_content WHERE {condition};")
+        return delete, insert
+
+    def install(self):
+        """  FTS5, -   """
+        conn = self.db.conn
+        if conn.in_transaction:
+            conn.commit()
+        #   : ,    
+        #  ,    
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            self._install_locked()
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+
+    def _install_locked(self):
+        conn = self.db.conn
+        conn.execute(self._content_view())
+        conn.execute(f'''
+        CREATE VIRTUAL TABLE IF NOT EXISTS defect_fts USING fts5(
+            {', '.join(self.TEXT_COLUMNS)}, facets,
+            content='defect_search_content',
+            content_rowid='defect_id',
+            tokenize='unicode61 remove_diacritics 2',
+            prefix='2 3'
+        )
+        ''')
+
+        triggers = {}
+        delete, insert = self._reindex('defect_id = NEW.id')
+        triggers['fts_defect_insert'] = f'AFTER INSERT ON defect BEGIN {insert} END'
+        triggers['fts_defect_after_update'] = f'AFTER UPDATE ON defect BEGIN {insert} END'
+        delete, _ = self._reindex('defect_id = OLD.id')
+        triggers['fts_defect_before_update'] = f'BEFORE UPDATE ON defect BEGIN {delete} END'
+        #     ArchiveManager    
+        ArchiveManager.ensure_guard(conn)
+        guard = ArchiveManager.GUARD_CONDITION
+        triggers['fts_defect_delete'] = f'BEFORE DELETE ON defect WHEN {guard} BEGIN {delete} END'
+
+        condition = 'defect_id IN (SELECT id FROM defect WHERE device_id = {row}.id)'
+        delete, _ = self._reindex(condition.format(row='OLD'))
+        _, insert = self._reindex(condition.format(row='NEW'))
+        triggers['fts_device_before_update'] = f'BEFORE UPDATE OF model_id ON device BEGIN {delete} END'
+        triggers['fts_device_after_update'] = f'AFTER UPDATE OF model_id ON device BEGIN {insert} END'
+
+        for table in ('diagnosis', 'repair', 'defect_image'):
+            for operation, rows in (('insert', ('NEW',)), ('update', ('OLD', 'NEW')),
+                                    ('delete', ('OLD',))):
+                condition = 'defect_id IN (' + ', '.join(f'{r}.defect_id' for r in rows) + ')'
+                delete, insert = self._reindex(condition)
+                when = f'WHEN {guard} ' if operation == 'delete' else ''
+                triggers[f'fts_{table}_before_{operation}'] = (
+                    f'BEFORE {operation.upper()} ON {table} {when}BEGIN {delete} END')
+                triggers[f'fts_{table}_after_{operation}'] = (
+                    f'AFTER {operation.upper()} ON {table} {when}BEGIN {insert} END')
+
+        for name, body in triggers.items():
+            conn.execute(f'DROP TRIGGER IF EXISTS {name}')
+            conn.execute(f'CREATE TRIGGER {name} {body}')
+
+        #    :     
+        #  'delete'      
+        if not conn.execute('SELECT 1 FROM defect_fts_docsize LIMIT 1').fetchone():
+            conn.execute("INSERT INTO defect_fts (defect_fts) VALUES ('rebuild')")
+
+    def rebuild(self):
+        """    """
+        started = time.perf_counter()
+        self.db.conn.execute("INSERT INTO defect_fts (defect_fts) VALUES ('rebuild')")
+        self.db.conn.commit()
+        elapsed = time.perf_counter() - started
+        print(f"    {elapsed:.2f} ")
+        return elapsed
+
+    def optimize(self):
+        """  """
+        self.db.conn.execute("INSERT INTO defect_fts (defect_fts) VALUES ('optimize')")
+        self.db.conn.commit()
+
+    def _stem(self, term):
+        for ending in self.RUSSIAN_ENDINGS:
+            if len(term) - len(ending) >= 4 and term.endswith(ending):
+                return term[:-len(ending)]
+        return term
+
+    def build_query(self, text, stem=True, **facets):
+        """  MATCH     """
+        text = text.replace('', '').replace('', '')
+        terms = re.findall(r'\w+', text.lower())
+        if not terms:
+            raise ValueError("  ")
+        parts = []
+        for term in terms:
+            if stem and not term.isdigit():
+                parts.append(f'"{self._stem(term)}"*')
+            else:
+                parts.append(f'"{term}"')
+        #      , facets -   
+        query = '{' + ' '.join(self.TEXT_COLUMNS) + '} : (' + ' AND '.join(parts) + ')'
+        for name in ('model', 'manufacturer', 'severity'):
+            value = facets.get(f'{name}_id')
+            if value is not None:
+                query += f' AND facets : "{name}{int(value)}"'
+        return query
+
+    def search(self, text, model_id=None, manufacturer_id=None, severity_id=None,
+               limit=20, stem=True):
+        """ : id,      """
+        query = self.build_query(text, stem=stem, model_id=model_id,
+                                 manufacturer_id=manufacturer_id, severity_id=severity_id)
+        weights = ', '.join(str(w) for w in self.WEIGHTS)
+        cursor = self.db.conn.execute(f'''
+            SELECT rowid AS defect_id,
+                   bm25(defect_fts, {weights}) AS rank,
+                   snippet(defect_fts, -1, '[', ']', '...', 12) AS snippet
+            FROM defect_fts
+            WHERE defect_fts MATCH ?
+            ORDER BY rank
+            LIMIT ?
+        ''', (query, limit))
+        return [dict(row) for row in cursor.fetchall()]
+
+
+class AsyncDatabase:
+    """    :    ,    """
+
+    def __init__(self, db_file="smartphone_defects.db", readers=4, max_batch=500,
+                 max_delay=0.002):
+        self.db_file = db_file
+        self.readers = readers
+        self.max_batch = max_batch  #     
+        self.max_delay = max_delay  #    , 
+        self.pool = None
+        self._queue = None
+        self._writer_task = None
+        self._read_executor = None
+        self._write_executor = None
+        self.metrics = {'writes': 0, 'commits': 0, 'max_batch_seen': 0}
+
+    async def connect(self):
+        """      """
+        self.pool = ConnectionPool(self.db_file, readers=self.readers)
+        self._read_executor = ThreadPoolExecutor(self.readers, thread_name_prefix='db-read')
+        self._write_executor = ThreadPoolExecutor(1, thread_name_prefix='db-write')
+        self._queue = asyncio.Queue()
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        return self
+
+    async def close(self):
+        """     """
+        if self._writer_task is not None:
+            await self._queue.put(None)
+            await self._writer_task
+            self._writer_task = None
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(self._write_executor, self.pool.close)
+        self._read_executor.shutdown()
+        self._write_executor.shutdown()
+
+    async def __aenter__(self):
+        return await self.connect()
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    async def _writer_loop(self):
+        loop = asyncio.get_running_loop()
+        stopping = False
+        while not stopping:
+            item = await self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            deadline = loop.time() + self.max_delay
+            while len(batch) < self.max_batch:
+                timeout = deadline - loop.time()
+                try:
+                    item = self._queue.get_nowait() if timeout <= 0 else \
+                        await asyncio.wait_for(self._queue.get(), timeout)
+                except (asyncio.QueueEmpty, asyncio.TimeoutError):
+                    break
+                if item is None:
+                    stopping = True
+                    break
+                batch.append(item)
+
+            try:
+                results = await loop.run_in_executor(self._write_executor, self._write_batch,
+                                                     [(sql, params) for sql, params, _ in batch])
+            except Exception as e:
+                results = [e] * len(batch)
+            for (_, _, future), result in zip(batch, results):
+                if future.cancelled():
+                    continue
+                if isinstance(result, Exception):
+                    future.set_exception(result)
+                else:
+                    future.set_result(result)
+
+    def _write_batch(self, operations):
+        #    ;      
+        results = []
+        with self.pool.writer() as db:
+            conn = db.conn
+            if not conn.in_transaction:
+                conn.execute('BEGIN IMMEDIATE')
+            for sql, params in operations:
+                conn.execute('SAVEPOINT op')
+                try:
+                    cursor = conn.execute(sql, params)
+                    results.append(cursor.lastrowid)
+                    conn.execute('RELEASE op')
+                except sqlite3.Error as e:
+                    conn.execute('ROLLBACK TO op')
+                    conn.execute('RELEASE op')
+                    results.append(e)
+        self.metrics['writes'] += len(operations)
+        self.metrics['commits'] += 1
+        self.metrics['max_batch_seen'] = max(self.metrics['max_batch_seen'], len(operations))
+        return results
+
+    async def execute_write(self, sql, params=()):
+        """     ,  lastrowid"""
+        future = asyncio.get_running_loop().create_future()
+        await self._queue.put((sql, params, future))
+        return await future
+
+    def _read(self, sql, params):
+        with self.pool.reader() as db:
+            return [dict(row) for row in db.conn.execute(sql, params).fetchall()]
+
+    async def fetchall(self, sql, params=()):
+        """     """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._read_executor, self._read, sql, params)
+
+    async def fetchone(self, sql, params=()):
+        rows = await self.fetchall(sql, params)
+        return rows[0] if rows else None
+
+    async def _insert(self, table, allowed, fields):
+        unknown = set(fields) - set(allowed)
+        if unknown:
+            raise ValueError(f"  {table}: {', '.join(sorted(unknown))}")
+        columns = list(fields)
+        sql = (f'INSERT INTO {table} ({", ".join(columns)}) '
+               f'VALUES ({", ".join("?" * len(columns))})')
+        return await self.execute_write(sql, tuple(fields[c] for c in columns))
+
+    async def insert_device(self, **fields):
+        """ ,  id"""
+        return await self._insert('device', BulkLoader.DEVICE_COLUMNS, fields)
+
+    async def insert_defect(self, **fields):
+        """ ,  id"""
+        return await self._insert('defect', BulkLoader.DEFECT_COLUMNS, fields)
+
+    async def insert_diagnosis(self, **fields):
+        """ ,  id"""
+        return await self._insert('diagnosis', DataGenerator.DIAGNOSIS_COLUMNS, fields)
+
+    async def insert_repair(self, **fields):
+        """ ,  id"""
+        return await self._insert('repair', DataGenerator.REPAIR_COLUMNS, fields)
+
+    async def get_device_by_imei(self, imei):
+        return await self.fetchone('SELECT * FROM device WHERE imei = ?', (imei,))
+
+    async def get_device_defects(self, device_id):
+        return await self.fetchall(
+            'SELECT * FROM defect WHERE device_id = ? ORDER BY detection_date', (device_id,))
+
+    async def get_defect_diagnoses(self, defect_id):
+        return await self.fetchall(
+            'SELECT * FROM diagnosis WHERE defect_id = ? ORDER BY diagnosis_date', (defect_id,))
+
+    async def get_open_repairs(self, technician_id=None):
+        sql = "SELECT * FROM repair WHERE status IN ('pending', 'in_progress', 'on_hold')"
+        params = ()
+        if technician_id is not None:
+            sql += ' AND technician_id = ?'
+            params = (technician_id,)
+        return await self.fetchall(sql + ' ORDER BY start_date', params)
+
+
+class ReferenceCache:
+    """        """
+
+    #  ->   
+    TABLES = {
+        'user_role': ('role_name',),
+        'defect_type': ('name',),
+        'defect_location': ('name',),
+        'severity_level': ('level_name',),
+        'manufacturer': ('name',),
+        'smartphone_model': ('manufacturer_id', 'model_name'),
+    }
+
+    def __init__(self, db_setup):
+        self.db = db_setup
+        self.by_id = {}
+        self.by_name = {}
+        self.severity_by_score = {}
+        self.version = None
+        self._data_version = None
+        self._total_changes = None
+        self.loads = 0
+
+    def install(self):
+        """       """
+        conn = self.db.conn
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS reference_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO reference_version (id, version) VALUES (1, 0)')
+        for table in self.TABLES:
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS refver_{table}_{operation.lower()}
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE reference_version SET version = version + 1 WHERE id = 1;
+                END
+                ''')
+        conn.commit()
+
+    def _counter(self):
+        try:
+            row = self.db.conn.execute('SELECT version FROM reference_version WHERE id = 1').fetchone()
+        except sqlite3.OperationalError:
+            return None  #   
+        return row[0] if row else None
+
+    def is_stale(self):
+        """,      """
+        if self.version is None and self._data_version is None:
+            return True
+        conn = self.db.conn
+        # data_version     , total_changes -  
+        data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+        if data_version == self._data_version and conn.total_changes == self._total_changes:
+            return False
+        counter = self._counter()
+        if counter is None or counter != self.version:
+            #   :      refresh()
+            return True
+        #    ,   
+        self._data_version = data_version
+        self._total_changes = conn.total_changes
+        return False
+
+    def refresh(self, force=False):
+        """  ,   """
+        if not force and not self.is_stale():
+            return False
+        conn = self.db.conn
+        by_id, by_name = {}, {}
+        #         ( ),
+        #          
+        own_transaction = not conn.in_transaction
+        if own_transaction:
+            conn.execute('BEGIN')
+        try:
+            version = self._counter()
+            data_version = conn.execute('PRAGMA data_version').fetchone()[0]
+            for table, key in self.TABLES.items():
+                rows = conn.execute(f'SELECT * FROM {table}').fetchall()
+                by_id[table] = {row['id']: dict(row) for row in rows}
+                by_name[table] = {
+                    (row[key[0]] if len(key) == 1 else tuple(row[k] for k in key)): row['id']
+                    for row in rows
+                }
+        finally:
+            if own_transaction:
+                conn.commit()
+        self.by_id = by_id
+        self.by_name = by_name
+        self.severity_by_score = {row['score']: row['id']
+                                  for row in by_id['severity_level'].values()}
+        self.version = version
+        self._data_version = data_version
+        self._total_changes = conn.total_changes
+        self.loads += 1
+        return True
+
+    def id_of(self, table, name):
+        """id     (  - (manufacturer_id, model_name))"""
+        self.refresh()
+        try:
+            return self.by_name[table][name]
+        except KeyError:
+            raise ValueError(f"   {table}: {name}") from None
+
+    def get(self, table, record_id):
+        """   id"""
+        self.refresh()
+        try:
+            return self.by_id[table][record_id]
+        except KeyError:
+            raise ValueError(f"  {table}  id {record_id}") from None
+
+    def validate_defect(self, record):
+        """        """
+        self.refresh()
+        checks = (('defect_type_id', 'defect_type'), ('location_id', 'defect_location'),
+                  ('severity_id', 'severity_level'))
+        errors = [f"{field}={record.get(field)}" for field, table in checks
+                  if record.get(field) not in self.by_id[table]]
+        if errors:
+            raise ValueError(f"  : {', '.join(errors)}")
+        return True
+
+    def enrich_defect(self, record):
+        """    """
+        self.validate_defect(record)
+        severity = self.by_id['severity_level'][record['severity_id']]
+        enriched = dict(record)
+        enriched['defect_type_name'] = self.by_id['defect_type'][record['defect_type_id']]['name']
+        enriched['location_name'] = self.by_id['defect_location'][record['location_id']]['name']
+        enriched['severity_name'] = severity['level_name']
+        enriched['severity_score'] = severity['score']
+        return enriched
+
+    def model_label(self, model_id):
+        """    """
+        model = self.get('smartphone_model', model_id)
+        manufacturer = self.by_id['manufacturer'][model['manufacturer_id']]
+        return f"{manufacturer['name']} {model['model_name']}"
+
+
+class ArchiveManager:
+    """         """
+
+    TABLES = ('defect', 'diagnosis', 'repair', 'defect_image')
+    VIEW_TABLES = TABLES + ('operation_log',)
+
+    #   archive_guard      (
+    #       ),    , 
+    #        
+    GUARD_CONDITION = 'NOT EXISTS (SELECT 1 FROM archive_guard)'
+
+    @staticmethod
+    def ensure_guard(conn):
+        conn.execute('CREATE TABLE IF NOT EXISTS main.archive_guard (active INTEGER)')
+
+    @staticmethod
+    def registered(conn):
+        """ ,    : {: }"""
+        exists = conn.execute(
+            "SELECT 1 FROM main.sqlite_master WHERE type = 'table' AND name = 'archive_file'"
+        ).fetchone()
+        if exists is None:
+            return {}
+        return {row[0]: row[1] for row in
+                conn.execute('SELECT schema_name, path FROM main.archive_file ORDER BY schema_name')}
+
+    @classmethod
+    @contextmanager
+    def attached(cls, conn):
+        """    ,   """
+        if conn.in_transaction:
+            conn.commit()
+        current = {row[1] for row in conn.execute('PRAGMA database_list')}
+        added = []
+        try:
+            for schema, path in cls.registered(conn).items():
+                if schema in current:
+                    continue
+                # ATTACH      
+                if not Path(path).exists():
+                    raise FileNotFoundError(f'  : {path}')
+                conn.execute(f'ATTACH DATABASE ? AS {schema}', (path,))
+                added.append(schema)
+            schemas = sorted(name for name in current | set(added) if name.startswith('archive_'))
+            yield schemas
+        finally:
+            if conn.in_transaction:
+                conn.commit()
+            for schema in added:
+                conn.execute(f'DETACH DATABASE {schema}')
+
+    def __init__(self, db_setup, archive_dir=None, batch_size=500, pause=0.01):
+        self.db = db_setup
+        db_path = Path(db_setup.db_file)
+        self.archive_dir = Path(archive_dir) if archive_dir else db_path.parent / 'archive'
+        self.prefix = db_path.stem
+        self.batch_size = batch_size
+        self.pause = pause  #   ,     
+
+    def archive_path(self, year):
+        return self.archive_dir / f'{self.prefix}_archive_{year}.db'
+
+    def archive_years(self):
+        """,     """
+        if not self.archive_dir.exists():
+            return []
+        years = []
+        for path in self.archive_dir.glob(f'{self.prefix}_archive_*.db'):
+            suffix = path.stem.rsplit('_', 1)[-1]
+            if suffix.isdigit():
+                years.append(suffix)
+        return sorted(years)
+
+    def _attached(self):
+        return {row[1] for row in self.db.conn.execute('PRAGMA database_list')}
+
+    def _attach(self, year):
+        schema = f'archive_{year}'
+        if schema not in self._attached():
+            conn = self.db.conn
+            if conn.in_transaction:
+                conn.commit()
+            self.archive_dir.mkdir(parents=True, exist_ok=True)
+            path = str(self.archive_path(year).resolve())
+            conn.execute('ATTACH DATABASE ? AS ' + schema, (path,))
+            self._ensure_tables(schema)
+            #      BlobStore   
+            conn.execute('CREATE TABLE IF NOT EXISTS main.archive_file '
+                         '(schema_name TEXT PRIMARY KEY, path TEXT NOT NULL)')
+            conn.execute('INSERT OR REPLACE INTO main.archive_file (schema_name, path) VALUES (?, ?)',
+                         (schema, path))
+            conn.commit()
+        return schema
+
+    def _columns(self, schema, table):
+        return [(row[1], row[2]) for row in
+                self.db.conn.execute(f'PRAGMA {schema}.table_info({table})')]
+
+    def _ensure_tables(self, schema):
+        #     :      
+        conn = self.db.conn
+        for table in self.VIEW_TABLES:
+            main_columns = self._columns('main', table)
+            existing = {name for name, _ in self._columns(schema, table)}
+            if not existing:
+                columns = ', '.join(
+                    f'{name} {col_type} PRIMARY KEY' if name == 'id' else f'{name} {col_type}'
+                    for name, col_type in main_columns)
+                conn.execute(f'CREATE TABLE {schema}.{table} ({columns})')
+            else:
+                for name, col_type in main_columns:
+                    if name not in existing:
+                        conn.execute(f'ALTER TABLE {schema}.{table} ADD COLUMN {name} {col_type}')
+        conn.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_archive_defect_device '
+                     f'ON defect (device_id, detection_date)')
+        for table in ('diagnosis', 'repair', 'defect_image'):
+            conn.execute(f'CREATE INDEX IF NOT EXISTS {schema}.idx_archive_{table}_defect '
+                         f'ON {table} (defect_id)')
+        conn.commit()
+
+    #   : ,  ,   
+    CANDIDATE_CONDITION = '''
+        d.is_repaired = 1
+        AND d.detection_date < ?
+        AND NOT EXISTS (
+            SELECT 1 FROM main.repair r
+            WHERE r.defect_id = d.id AND r.status NOT IN ('completed', 'cancelled')
+        )
+    '''
+
+    def _candidates(self, cutoff, last_id):
+        #  :       id
+        return self.db.conn.execute(f'''
+            SELECT d.id, strftime('%Y', d.detection_date) AS year
+            FROM main.defect d
+            WHERE d.id > ? AND {self.CANDIDATE_CONDITION}
+            ORDER BY d.id
+            LIMIT ?
+        ''', (last_id, cutoff, self.batch_size)).fetchall()
+
+    def _recheck(self, ids, cutoff, year):
+        #     :    
+        #         
+        placeholders = ', '.join('?' * len(ids))
+        return [row[0] for row in self.db.conn.execute(f'''
+            SELECT d.id FROM main.defect d
+            WHERE d.id IN ({placeholders}) AND {self.CANDIDATE_CONDITION}
+              AND strftime('%Y', d.detection_date) IS ?
+        ''', (*ids, cutoff, year))]
+
+    def _unindex(self, condition, params):
+        #     ,      
+        conn = self.db.conn
+        if conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'defect_fts'").fetchone():
+            delete, _ = DefectSearch(self.db)._reindex(condition)
+            conn.execute(delete, params)
+
+    def _move(self, schema, table, where, params):
+        columns = ', '.join(name for name, _ in self._columns('main', table))
+        conn = self.db.conn
+        conn.execute(f'INSERT OR REPLACE INTO {schema}.{table} ({columns}) '
+                     f'SELECT {columns} FROM main.{table} WHERE {where}', params)
+        return conn.execute(f'DELETE FROM main.{table} WHERE {where}', params).rowcount
+
+    def archive(self, cutoff):
+        """    cutoff    """
+        conn = self.db.conn
+        started = time.perf_counter()
+        moved = {table: 0 for table in self.TABLES}
+        self.ensure_guard(conn)
+        last_id = 0
+        while True:
+            rows = self._candidates(cutoff, last_id)
+            if not rows:
+                break
+            last_id = rows[-1][0]
+            by_year = {}
+            for row in rows:
+                by_year.setdefault(row[1], []).append(row[0])
+            for year, ids in by_year.items():
+                schema = self._attach(year)
+                if conn.in_transaction:
+                    conn.commit()
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    ids = self._recheck(ids, cutoff, year)
+                    if not ids:
+                        conn.commit()
+                        continue
+                    placeholders = ', '.join('?' * len(ids))
+                    conn.execute('INSERT INTO archive_guard (active) VALUES (1)')
+                    self._unindex(f'defect_id IN ({placeholders})', ids)
+                    #   ,  , id 
+                    for table in ('diagnosis', 'repair', 'defect_image'):
+                        moved[table] += self._move(schema, table,
+                                                   f'defect_id IN ({placeholders})', ids)
+                    moved['defect'] += self._move(schema, 'defect', f'id IN ({placeholders})', ids)
+                    conn.execute('DELETE FROM archive_guard')
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            if self.pause:
+                time.sleep(self.pause)
+        elapsed = time.perf_counter() - started
+        print(f"  {elapsed:.2f} : {moved}")
+        return {'moved': moved, 'seconds': round(elapsed, 3)}
+
+    def archive_operation_log(self, cutoff):
+        """     cutoff"""
+        conn = self.db.conn
+        moved = 0
+        while True:
+            rows = conn.execute('''
+                SELECT id, strftime('%Y', operation_date) FROM operation_log
+                WHERE operation_date < ? ORDER BY id LIMIT ?
+            ''', (cutoff, self.batch_size)).fetchall()
+            if not rows:
+                break
+            by_year = {}
+            for row in rows:
+                by_year.setdefault(row[1], []).append(row[0])
+            for year, ids in by_year.items():
+                schema = self._attach(year)
+                if conn.in_transaction:
+                    conn.commit()
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    moved += self._move(schema, 'operation_log',
+                                        f'id IN ({", ".join("?" * len(ids))})', ids)
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+            if self.pause:
+                time.sleep(self.pause)
+        return moved
+
+    def attach_archives(self):
+        """       all_<>"""
+        schemas = [self._attach(year) for year in self.archive_years()]
+        conn = self.db.conn
+        for table in self.VIEW_TABLES:
+            columns = ', '.join(name for name, _ in self._columns('main', table))
+            parts = [f'SELECT {columns} FROM main.{table}']
+            parts += [f'SELECT {columns} FROM {schema}.{table}' for schema in schemas]
+            conn.execute(f'DROP VIEW IF EXISTS temp.all_{table}')
+            conn.execute(f'CREATE TEMP VIEW all_{table} AS ' + ' UNION ALL '.join(parts))
+        conn.commit()
+        return schemas
+
+    def detach_archives(self):
+        """     """
+        conn = self.db.conn
+        if conn.in_transaction:
+            conn.commit()
+        for table in self.VIEW_TABLES:
+            conn.execute(f'DROP VIEW IF EXISTS temp.all_{table}')
+        for schema in self._attached():
+            if schema.startswith('archive_'):
+                conn.execute(f'DETACH DATABASE {schema}')
+
+
+class DeviceLookup:
+    """    IMEI   ,    """
+
+    DEVICE_QUERY = '''
+        SELECT dv.id, dv.imei, dv.serial_number, dv.color, dv.production_date,
+               dv.warranty_until, dv.current_owner,
+               sm.id AS model_id, sm.model_name, m.id AS manufacturer_id, m.name AS manufacturer,
+               (SELECT COUNT(*) FROM defect d
+                WHERE d.device_id = dv.id AND d.is_repaired = 0) AS open_defects
+        FROM device dv
+        JOIN smartphone_model sm ON sm.id = dv.model_id
+        JOIN manufacturer m ON m.id = sm.manufacturer_id
+    '''
+    IN_LIST_LIMIT = 500  #     IN (...),  - json_each
+
+    def __init__(self, db_setup, cache_size=10000, ttl=30.0):
+        self.db = db_setup
+        self.cache_size = cache_size
+        self.ttl = ttl  # :      
+        self._cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def normalize_imei(raw):
+        """  ; 14   , IMEISV """
+        digits = re.sub(r'\D', '', str(raw))
+        if len(digits) == 16:  # IMEISV: TAC + SNR +  
+            digits = digits[:14]
+        if len(digits) == 14:
+            digits += DataGenerator.luhn_digit(digits)
+        if len(digits) != 15:
+            raise ValueError(f"  IMEI: {raw}")
+        return digits
+
+    @staticmethod
+    def is_valid_imei(imei):
+        """ 15- IMEI   """
+        return (len(imei) == 15 and imei.isdigit()
+                and DataGenerator.luhn_digit(imei[:14]) == imei[14])
+
+    @staticmethod
+    def normalize_serial(raw):
+        return re.sub(r'\s+', '', str(raw)).upper()
+
+    def _cache_get(self, key):
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._cache[key]
+            return None
+        self._cache.move_to_end(key)
+        return entry[1]
+
+    def _cache_put(self, key, row):
+        self._cache[key] = (time.monotonic(), row)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+
+    def invalidate(self, device=None):
+        """      """
+        if device is None:
+            self._cache.clear()
+            return
+        for key in [('imei', device.get('imei')), ('serial_number', device.get('serial_number'))]:
+            self._cache.pop(key, None)
+
+    def _fetch(self, column, keys):
+        conn = self.db.conn
+        if len(keys) <= self.IN_LIST_LIMIT:
+            placeholders = ', '.join('?' * len(keys))
+            cursor = conn.execute(f'{self.DEVICE_QUERY} WHERE dv.{column} IN ({placeholders})',
+                                  keys)
+            return [dict(row) for row in cursor.fetchall()]
+        #  :   JSON-  json_each,    temp
+        # (     query_only)
+        cursor = conn.execute(self.DEVICE_QUERY.replace(
+            'FROM device dv', f'FROM json_each(?) k JOIN device dv ON dv.{column} = k.value'),
+            (json.dumps(keys),))
+        return [dict(row) for row in cursor.fetchall()]
+
+    def _resolve(self, column, keys):
+        found = {}
+        pending = []
+        for key in dict.fromkeys(keys):
+            row = self._cache_get((column, key))
+            if row is not None:
+                self.hits += 1
+                found[key] = row
+            else:
+                self.misses += 1
+                pending.append(key)
+        if pending:
+            for row in self._fetch(column, pending):
+                found[row[column]] = row
+                self._cache_put(('imei', row['imei']), row)
+                self._cache_put(('serial_number', row['serial_number']), row)
+        missing = [key for key in dict.fromkeys(keys) if key not in found]
+        return found, missing
+
+    def resolve_imeis(self, raw_imeis, strict=False):
+        """    IMEI  
+
+        IMEI       checksum_failed,  
+              (     );
+        strict=True    ."""
+        keys, invalid, checksum_failed = [], [], []
+        for raw in raw_imeis:
+            try:
+                imei = self.normalize_imei(raw)
+            except ValueError:
+                invalid.append(raw)
+                continue
+            if not self.is_valid_imei(imei):
+                if strict:
+                    invalid.append(raw)
+                    continue
+                checksum_failed.append(raw)
+            keys.append(imei)
+        found, missing = self._resolve('imei', keys)
+        return {'found': found, 'missing': missing, 'invalid': invalid,
+                'checksum_failed': checksum_failed}
+
+    def resolve_serials(self, raw_serials):
+        """     """
+        keys = [self.normalize_serial(raw) for raw in raw_serials]
+        found, missing = self._resolve('serial_number', keys)
+        return {'found': found, 'missing': missing, 'invalid': [], 'checksum_failed': []}
+
+    def lookup_imei(self, raw, strict=False):
+        """   IMEI  None"""
+        result = self.resolve_imeis([raw], strict=strict)
+        return next(iter(result['found'].values()), None)
+
+    def lookup_serial(self, raw):
+        """     None"""
+        result = self.resolve_serials([raw])
+        return next(iter(result['found'].values()), None)
+
+
+def _report_partition(db_file, start, end, watermark):
+    """     [start, end)   """
+    conn = sqlite3.connect(f'file:{db_file}?mode=ro', uri=True)
+    try:
+        conn.execute('PRAGMA query_only = 1')
+        conn.execute('PRAGMA cache_size = -65536')
+        max_defect, max_repair, max_diagnosis = (watermark['defect'], watermark['repair'],
+                                                 watermark['diagnosis'])
+        partial = {'defects': {}, 'repair_time': {}, 'cost_variance': {}, 'technicians': {}}
+
+        for model_id, count in conn.execute('''
+            SELECT dv.model_id, COUNT(*)
+            FROM defect d JOIN device dv ON dv.id = d.device_id
+            WHERE d.detection_date >= ? AND d.detection_date < ? AND d.id <= ?
+            GROUP BY dv.model_id
+        ''', (start, end, max_defect)):
+            partial['defects'][model_id] = count
+
+        for model_id, hours, count in conn.execute('''
+            SELECT dv.model_id, SUM((julianday(r.end_date) - julianday(r.start_date)) * 24), COUNT(*)
+            FROM repair r
+            JOIN defect d ON d.id = r.defect_id
+            JOIN device dv ON dv.id = d.device_id
+            WHERE r.start_date >= ? AND r.start_date < ? AND r.id <= ?
+              AND r.status = 'completed' AND r.end_date IS NOT NULL
+            GROUP BY dv.model_id
+        ''', (start, end, max_repair)):
+            partial['repair_time'][model_id] = [hours or 0.0, count]
+
+        #     : n, ,  
+        for model_id, n, total, squares in conn.execute('''
+            SELECT dv.model_id, COUNT(*), SUM(r.cost - dg.estimated_cost),
+                   SUM((r.cost - dg.estimated_cost) * (r.cost - dg.estimated_cost))
+            FROM repair r
+            JOIN diagnosis dg ON dg.defect_id = r.defect_id AND dg.id <= ?
+            JOIN defect d ON d.id = r.defect_id
+            JOIN device dv ON dv.id = d.device_id
+            WHERE r.start_date >= ? AND r.start_date < ? AND r.id <= ?
+              AND r.cost IS NOT NULL AND dg.estimated_cost IS NOT NULL
+            GROUP BY dv.model_id
+        ''', (max_diagnosis, start, end, max_repair)):
+            partial['cost_variance'][model_id] = [n, total, squares]
+
+        for technician_id, completed, hours, cost in conn.execute('''
+            SELECT technician_id, COUNT(*), TOTAL(labor_hours), TOTAL(cost)
+            FROM repair
+            WHERE start_date >= ? AND start_date < ? AND id <= ? AND status = 'completed'
+            GROUP BY technician_id
+        ''', (start, end, max_repair)):
+            partial['technicians'][technician_id] = [completed, hours, cost]
+        return partial
+    finally:
+        conn.close()
+
+
+class ReportEngine:
+    """         """
+
+    # ,      
+    TABLES = ('defect', 'repair', 'diagnosis', 'device', 'smartphone_model', 'manufacturer',
+              'technician')
+
+    def __init__(self, db_setup, workers=None, cache_dir=None):
+        self.db = db_setup
+        self.workers = workers or os.cpu_count() or 2
+        db_path = Path(db_setup.db_file)
+        self.cache_dir = Path(cache_dir) if cache_dir else db_path.parent / 'report_cache'
+        self._memory_cache = {}
+
+    def install(self):
+        """        """
+        conn = self.db.conn
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS report_data_version (
+            id INTEGER PRIMARY KEY CHECK (id = 1),
+            version INTEGER NOT NULL
+        )
+        ''')
+        conn.execute('INSERT OR IGNORE INTO report_data_version (id, version) VALUES (1, 0)')
+        for table in self.TABLES:
+            for operation in ('INSERT', 'UPDATE', 'DELETE'):
+                conn.execute(f'''
+                CREATE TRIGGER IF NOT EXISTS rptver_{table}_{operation.lower()}
+                AFTER {operation} ON {table}
+                BEGIN
+                    UPDATE report_data_version SET version = version + 1 WHERE id = 1;
+                END
+                ''')
+        conn.commit()
+
+    def watermark(self):
+        """  :     id"""
+        conn = self.db.conn
+        try:
+            row = conn.execute('SELECT version FROM report_data_version WHERE id = 1').fetchone()
+        except sqlite3.OperationalError:
+            row = None  #   ,   
+        mark = {'version': row[0] if row else None}
+        #  id      -
+        for table in ('defect', 'repair', 'diagnosis', 'device'):
+            mark[table] = conn.execute(f'SELECT IFNULL(MAX(id), 0) FROM {table}').fetchone()[0]
+        return mark
+
+    @staticmethod
+    def month_ranges(start, end):
+        """  [start, end)   """
+        current = datetime.strptime(start[:10], '%Y-%m-%d')
+        finish = datetime.strptime(end[:10], '%Y-%m-%d')
+        ranges = []
+        while current < finish:
+            following = (current.replace(day=1) + timedelta(days=32)).replace(day=1)
+            upper = min(following, finish)
+            ranges.append((current.strftime('%Y-%m-%d'), upper.strftime('%Y-%m-%d')))
+            current = upper
+        return ranges
+
+    def _cache_path(self, key):
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()[:32]
+        return self.cache_dir / f'report_{digest}.json'
+
+    def quality_report(self, start, end, use_cache=True):
+        """    [start, end): ,    , """
+        watermark = self.watermark()
+        key = json.dumps({'report': 'quality', 'start': start, 'end': end,
+                          'watermark': watermark}, sort_keys=True)
+        use_cache = use_cache and watermark['version'] is not None
+        if use_cache:
+            if key in self._memory_cache:
+                return self._memory_cache[key]
+            path = self._cache_path(key)
+            if path.exists():
+                report = json.loads(path.read_text(encoding='utf-8'))
+                self._memory_cache[key] = report
+                return report
+
+        started = time.perf_counter()
+        ranges = self.month_ranges(start, end)
+        db_file = str(Path(self.db.db_file).resolve())
+        if len(ranges) > 1 and self.workers > 1:
+            with ProcessPoolExecutor(min(self.workers, len(ranges))) as executor:
+                partials = list(executor.map(_report_partition, [db_file] * len(ranges),
+                                             [r[0] for r in ranges], [r[1] for r in ranges],
+                                             [watermark] * len(ranges)))
+        else:
+            partials = [_report_partition(db_file, s, e, watermark) for s, e in ranges]
+
+        report = self._merge(partials)
+        report['period'] = [start, end]
+        report['partitions'] = len(ranges)
+        report['watermark'] = watermark
+        report['seconds'] = round(time.perf_counter() - started, 3)
+
+        if watermark['version'] is not None:
+            self._memory_cache[key] = report
+            self.cache_dir.mkdir(parents=True, exist_ok=True)
+            path = self._cache_path(key)
+            tmp = path.with_suffix('.tmp')
+            tmp.write_text(json.dumps(report, ensure_ascii=False), encoding='utf-8')
+            os.replace(tmp, path)
+        print(f"  {start} - {end}   {report['seconds']}  "
+              f"({len(ranges)} )")
+        return report
+
+    def _merge(self, partials):
+        conn = self.db.conn
+        defects, repair_time, variance, technicians = {}, {}, {}, {}
+        for part in partials:
+            for model_id, count in part['defects'].items():
+                defects[model_id] = defects.get(model_id, 0) + count
+            for model_id, (hours, n) in part['repair_time'].items():
+                acc = repair_time.setdefault(model_id, [0.0, 0])
+                acc[0] += hours
+                acc[1] += n
+            for model_id, (n, total, squares) in part['cost_variance'].items():
+                acc = variance.setdefault(model_id, [0, 0.0, 0.0])
+                acc[0] += n
+                acc[1] += total
+                acc[2] += squares
+            for technician_id, (completed, hours, cost) in part['technicians'].items():
+                acc = technicians.setdefault(technician_id, [0, 0.0, 0.0])
+                acc[0] += completed
+                acc[1] += hours
+                acc[2] += cost
+
+        models = {row['id']: dict(row) for row in conn.execute('''
+            SELECT sm.id, sm.model_name, m.id AS manufacturer_id, m.name AS manufacturer,
+                   (SELECT COUNT(*) FROM device dv WHERE dv.model_id = sm.id) AS devices
+            FROM smartphone_model sm JOIN manufacturer m ON m.id = sm.manufacturer_id
+        ''')}
+
+        model_rows, by_manufacturer = [], {}
+        for model_id in sorted(set(defects) | set(repair_time) | set(variance)):
+            info = models.get(model_id, {'model_name': None, 'manufacturer_id': None,
+                                         'manufacturer': None, 'devices': 0})
+            count = defects.get(model_id, 0)
+            hours, repairs = repair_time.get(model_id, [0.0, 0])
+            n, total, squares = variance.get(model_id, [0, 0.0, 0.0])
+            mean = total / n if n else None
+            model_rows.append({
+                'model_id': model_id,
+                'model_name': info['model_name'],
+                'manufacturer': info['manufacturer'],
+                'devices': info['devices'],
+                'defects': count,
+                'defects_per_device': round(count / info['devices'], 4) if info['devices'] else None,
+                'mean_repair_hours': round(hours / repairs, 2) if repairs else None,
+                'cost_variance_mean': round(mean, 2) if mean is not None else None,
+                'cost_variance_std': round(max(squares / n - mean * mean, 0.0) ** 0.5, 2) if n else None,
+            })
+            acc = by_manufacturer.setdefault(info['manufacturer'], [0, 0, 0.0, 0])
+            acc[0] += count
+            acc[1] += info['devices']
+            acc[2] += hours
+            acc[3] += repairs
+
+        manufacturer_rows = [{
+            'manufacturer': name,
+            'defects': count,
+            'devices': devices,
+            'defects_per_device': round(count / devices, 4) if devices else None,
+            'mean_repair_hours': round(hours / repairs, 2) if repairs else None,
+        } for name, (count, devices, hours, repairs) in sorted(
+            by_manufacturer.items(), key=lambda kv: -kv[1][0])]
+
+        names = {row[0]: row[1] for row in conn.execute('SELECT id, name FROM technician')}
+        technician_rows = [{
+            'technician_id': technician_id,
+            'name': names.get(technician_id),
+            'completed_repairs': completed,
+            'labor_hours': round(hours, 2),
+            'revenue': round(cost, 2),
+        } for technician_id, (completed, hours, cost) in sorted(
+            technicians.items(), key=lambda kv: -kv[1][0])]
+
+        return {'models': model_rows, 'manufacturers': manufacturer_rows,
+                'technicians': technician_rows}
+
+
+class MaintenanceScheduler:
+    """ : incremental_vacuum, ANALYZE, quick_check, checkpoint"""
+
+    TABLES = ('device', 'defect', 'diagnosis', 'repair', 'defect_image', 'operation_log',
+              'image_blob')
+
+    def __init__(self, db_setup, time_budget=5.0, vacuum_step_pages=256,
+                 analyze_threshold=0.1, interval=3600.0, analysis_limit=1000):
+        self.db = db_setup
+        self.time_budget = time_budget  #     , 
+        self.vacuum_step_pages = vacuum_step_pages  #     
+        self.analyze_threshold = analyze_threshold  #      ANALYZE
+        self.analysis_limit = analysis_limit  #     ANALYZE
+        self.interval = interval
+        self.history = deque(maxlen=100)
+        self._stop = threading.Event()
+        self._thread = None
+
+    def enable_incremental_vacuum(self):
+        """    auto_vacuum=INCREMENTAL (  VACUUM)"""
+        conn = self.db.conn
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2:
+            return False
+        if conn.in_transaction:
+            conn.commit()
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+        return True
+
+    def storage_stats(self):
+        """     """
+        conn = self.db.conn
+        page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+        freelist = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        return {
+            'page_count': page_count,
+            'freelist_count': freelist,
+            'fragmentation': round(freelist / page_count, 4) if page_count else 0.0,
+            'bytes': page_count * page_size,
+        }
+
+    def _remaining(self, started):
+        return self.time_budget - (time.perf_counter() - started)
+
+    def _ensure_state(self):
+        conn = self.db.conn
+        conn.execute('''
+        CREATE TABLE IF NOT EXISTS maintenance_state (
+            table_name TEXT PRIMARY KEY,
+            row_count INTEGER NOT NULL,
+            max_id INTEGER,
+            analyzed_at DATETIME DEFAULT CURRENT_TIMESTAMP
+        )
+        ''')
+        columns = {row[1] for row in conn.execute('PRAGMA table_info(maintenance_state)')}
+        if 'max_id' not in columns:
+            conn.execute('ALTER TABLE maintenance_state ADD COLUMN max_id INTEGER')
+
+    def _stat_rows(self):
+        #     ANALYZE:    stat  sqlite_stat1
+        try:
+            return {row[0]: row[1] for row in self.db.conn.execute(
+                'SELECT tbl, MAX(CAST(stat AS INTEGER)) FROM sqlite_stat1 GROUP BY tbl')}
+        except sqlite3.OperationalError:
+            return {}  # ANALYZE   
+
+    def incremental_vacuum(self, started):
+        """   ,   """
+        conn = self.db.conn
+        if conn.execute('PRAGMA auto_vacuum').fetchone()[0] != 2:
+            return 0
+        freed = 0
+        while self._remaining(started) > 0:
+            before = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            if before == 0:
+                break
+            if conn.in_transaction:
+                conn.commit()
+            conn.execute(f'PRAGMA incremental_vacuum({self.vacuum_step_pages})').fetchall()
+            after = conn.execute('PRAGMA freelist_count').fetchone()[0]
+            freed += before - after
+            if after >= before:
+                break
+        return freed
+
+    def analyze_changed(self, started):
+        """ANALYZE      ,     """
+        conn = self.db.conn
+        self._ensure_state()
+        existing = {row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table'")}
+        known = {row[0]: (row[1], row[2]) for row in conn.execute(
+            'SELECT table_name, row_count, max_id FROM maintenance_state')}
+        stat_rows = self._stat_rows()
+        # analysis_limit      ,
+        #  ANALYZE       
+        previous_limit = conn.execute('PRAGMA analysis_limit').fetchone()[0]
+        conn.execute(f'PRAGMA analysis_limit = {self.analysis_limit}')
+        analyzed = []
+        try:
+            for table in self.TABLES:
+                if table not in existing:
+                    continue
+                if self._remaining(started) <= 0:
+                    break
+                #    MAX(rowid) (  B-,   COUNT(*)),
+                #    PRAGMA optimize
+                max_id = conn.execute(f'SELECT IFNULL(MAX(rowid), 0) FROM {table}').fetchone()[0]
+                rows, previous = known.get(table, (None, None))
+                rows = stat_rows.get(table, rows)
+                if (previous is not None and rows is not None
+                        and abs(max_id - previous) <= self.analyze_threshold * max(rows, 1)):
+                    continue
+                conn.execute(f'ANALYZE {table}')
+                conn.execute('''
+                    INSERT INTO maintenance_state (table_name, row_count, max_id, analyzed_at)
+                    VALUES (?, ?, ?, CURRENT_TIMESTAMP)
+                    ON CONFLICT (table_name) DO UPDATE SET
+                        row_count = excluded.row_count, max_id = excluded.max_id,
+                        analyzed_at = excluded.analyzed_at
+                ''', (table, self._stat_rows().get(table, 0), max_id))
+                conn.commit()
+                analyzed.append(table)
+            if self._remaining(started) > 0:
+                conn.execute('PRAGMA optimize')
+        finally:
+            conn.execute(f'PRAGMA analysis_limit = {previous_limit}')
+        return analyzed
+
+    def _previous_progress_handler(self):
+        #     ;    QueryMonitor
+        conn = self.db.conn
+        if isinstance(conn, InstrumentedConnection):
+            return conn._monitor.progress_handler()
+        return None, 0
+
+    def quick_check(self, started):
+        """PRAGMA quick_check      """
+        conn = self.db.conn
+        previous, previous_steps = self._previous_progress_handler()
+
+        def on_progress():
+            if self._remaining(started) <= 0:
+                return 1
+            return previous() if previous is not None else 0
+
+        steps = min(10000, previous_steps) if previous is not None else 10000
+        conn.set_progress_handler(on_progress, steps)
+        try:
+            rows = conn.execute('PRAGMA quick_check').fetchall()
+            return [row[0] for row in rows]
+        except sqlite3.OperationalError as e:
+            if 'interrupted' in str(e):
+                return None  #     
+            raise
+        finally:
+            #    ,   
+            conn.set_progress_handler(previous, previous_steps)
+
+    def checkpoint(self):
+        """ checkpoint WAL:     """
+        busy, log_frames, checkpointed = self.db.conn.execute(
+            'PRAGMA wal_checkpoint(PASSIVE)').fetchone()
+        return {'busy': busy, 'log_frames': log_frames, 'checkpointed': checkpointed}
+
+    def run_once(self):
+        """     time_budget"""
+        started = time.perf_counter()
+        before = self.storage_stats()
+        report = {'started_at': datetime.now().isoformat(timespec='seconds'), 'before': before}
+        durations = {}
+
+        t0 = time.perf_counter()
+        report['freed_pages'] = self.incremental_vacuum(started)
+        durations['incremental_vacuum'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        report['analyzed'] = self.analyze_changed(started)
+        durations['analyze'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        report['quick_check'] = self.quick_check(started)
+        durations['quick_check'] = time.perf_counter() - t0
+
+        t0 = time.perf_counter()
+        report['checkpoint'] = self.checkpoint()
+        durations['checkpoint'] = time.perf_counter() - t0
+
+        report['after'] = self.storage_stats()
+        report['durations'] = {k: round(v, 4) for k, v in durations.items()}
+        report['seconds'] = round(time.perf_counter() - started, 4)
+        self.history.append(report)
+        status = 'ok' if report['quick_check'] == ['ok'] else report['quick_check']
+        print(f":   {report['freed_pages']}, "
+              f"ANALYZE {report['analyzed']},  {status}, {report['seconds']} ")
+        return report
+
+    def start(self, interval=None):
+        """       """
+        interval = self.interval if interval is None else interval
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stop.clear()
+
+        def loop():
+            db = DatabaseSetup(self.db.db_file)
+            db.connect()
+            worker = MaintenanceScheduler(db, self.time_budget, self.vacuum_step_pages,
+                                          self.analyze_threshold, interval,
+                                          analysis_limit=self.analysis_limit)
+            worker.history = self.history
+            try:
+                while not self._stop.wait(interval):
+                    try:
+                        worker.run_once()
+                    except sqlite3.Error as e:
+                        print(f"  : {e}")
+            finally:
+                db.disconnect()
+
+        self._thread = threading.Thread(target=loop, name='db-maintenance', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        """  """
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+
+
 if __name__ == "__main__":
     db_setup = DatabaseSetup()
     db_setup.create_database()
@@ -0,0 +1,81 @@
+import sqlite3
+import sys
+import tempfile
+import types
+import unittest
+from contextlib import redirect_stdout
+from io import StringIO
+from pathlib import Path
+
+MODULE_PATH = Path(__file__).with_name('database_setup.py.py')
+
+
+def load_module():
+    """Загрузить модуль настройки базы (исходник в кодировке cp1251)"""
+    module = types.ModuleType('database_setup')
+    module.__file__ = str(MODULE_PATH)
+    sys.modules['database_setup'] = module
+    source = MODULE_PATH.read_bytes().decode('cp1251')
+    exec(compile(source, str(MODULE_PATH), 'exec'), module.__dict__)
+    return module
+
+
+database_setup = load_module()
+
+
+class DefectSearchInstallTest(unittest.TestCase):
+    """Установка полнотекстового поиска на базу с уже существующими данными"""
+
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.db = database_setup.DatabaseSetup(str(Path(self.tmp.name) / 'defects.db'))
+        with redirect_stdout(StringIO()):
+            self.db.create_database()
+        self.db.connect()
+        self.search = database_setup.DefectSearch(self.db)
+
+    def tearDown(self):
+        self.db.disconnect()
+        self.tmp.cleanup()
+
+    def check_integrity(self):
+        self.db.conn.execute("INSERT INTO defect_fts (defect_fts) VALUES ('integrity-check')")
+
+    def test_install_indexes_existing_rows(self):
+        self.search.install()
+        self.assertTrue(self.search.search('царапина'))
+        self.check_integrity()
+
+    def test_update_after_install(self):
+        self.search.install()
+        defect_id = self.db.conn.execute('SELECT MIN(id) FROM defect').fetchone()[0]
+        self.db.conn.execute('UPDATE defect SET description = ? WHERE id = ?',
+                             ('Отслоение защитного стекла', defect_id))
+        self.db.conn.commit()
+        self.check_integrity()
+        found = [row['defect_id'] for row in self.search.search('отслоение')]
+        self.assertEqual(found, [defect_id])
+
+    def test_child_rows_after_install(self):
+        self.search.install()
+        defect_id = self.db.conn.execute(
+            'SELECT defect_id FROM diagnosis ORDER BY id LIMIT 1').fetchone()[0]
+        self.db.conn.execute('UPDATE diagnosis SET conclusion = ? WHERE defect_id = ?',
+                             ('Окисление контактов', defect_id))
+        self.db.conn.execute('DELETE FROM defect_image WHERE defect_id = ?', (defect_id,))
+        self.db.conn.commit()
+        self.check_integrity()
+        found = [row['defect_id'] for row in self.search.search('окисление')]
+        self.assertEqual(found, [defect_id])
+
+    def test_repeated_install(self):
+        self.search.install()
+        self.search.install()
+        self.check_integrity()
+        total = self.db.conn.execute('SELECT COUNT(*) FROM defect').fetchone()[0]
+        indexed = self.db.conn.execute('SELECT COUNT(*) FROM defect_fts_docsize').fetchone()[0]
+        self.assertEqual(indexed, total)
+
+
+if __name__ == '__main__':
+    unittest.main()